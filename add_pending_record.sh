@@ -16,20 +16,18 @@ if [ ! -d "venv" ]; then
     python3 -m venv venv
 fi
 
-# 激活虚拟环境
-. venv/bin/activate
-
-# 安装依赖（如果有 requirements.txt）
+# 仅在 requirements.txt 变化后安装依赖
 if [ -f "requirements.txt" ]; then
-    pip install --upgrade pip >/dev/null
-    pip install -r requirements.txt >/dev/null
+    stamp="venv/.requirements.sha256"
+    checksum=$(sha256sum requirements.txt | cut -d ' ' -f 1)
+    if [ ! -f "$stamp" ] || [ "$(cat "$stamp")" != "$checksum" ]; then
+        venv/bin/pip install --upgrade pip >/dev/null
+        venv/bin/pip install -r requirements.txt >/dev/null
+        echo "$checksum" > "$stamp"
+    fi
 fi
 
-# 从标准输入读取 JSON 数据并传给 Python 脚本
-cat - | venv/bin/python src/add_pending_record.py
-
-# 退出虚拟环境
-deactivate
+# 从标准输入读取 JSON 数据，优先交给正在运行的监控，监控未运行时直接写入
+cat - | venv/bin/python src/submit_record.py
 
 echo "完成"
-:wq
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""账号状态存储
+
+每个账号（Cookie、mid、用户名、等级、是否过期）单独保存为
+``config/accounts/<key>.json``。:meth:`AccountStore.sync` 与上次写入的
+内容比较，只重写发生变化的账号文件，写入时先写临时文件再替换。多个
+线程同时同步时串行执行，临时文件名带进程号，避免多个进程互相覆盖。
+"""
+import json
+import os
+import threading
+import time
+from hashlib import md5
+from typing import Dict, List
+
+from logger import logger
+
+
+def account_key(acc: dict) -> str:
+    """账号文件名，优先使用 mid，尚未获取 mid 的账号使用 SESSDATA 的摘要"""
+    if acc.get('mid'):
+        return str(acc['mid'])
+    return 'sess_' + md5(str(acc.get('sessdata', '')).encode('utf-8')).hexdigest()[:12]
+
+
+class AccountStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        # 文件名 -> 上次写入（或读取）的内容，用于判断账号是否有变化
+        self._saved: Dict[str, dict] = {}
+        self._added_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self) -> List[dict]:
+        """按添加顺序读取全部账号"""
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> List[dict]:
+        entries = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-5]
+                try:
+                    with open(self._path(key), 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    logger.exception(f"读取账号文件失败: {name}")
+                    continue
+                entries.append((entry.get('added_at', 0), key, entry['account']))
+
+        entries.sort(key=lambda e: (e[0], e[1]))
+        self._saved = {key: dict(acc) for _, key, acc in entries}
+        self._added_at = {key: added_at for added_at, key, _ in entries}
+        return [acc for _, _, acc in entries]
+
+    def _write(self, key: str, acc: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        acc = dict(acc)  # 写入时账号可能正在被刷新Cookie的线程修改
+        if key not in self._added_at:
+            # 保证同一批写入的账号顺序不变
+            self._added_at[key] = max([time.time()] + [t + 0.001 for t in self._added_at.values()])
+        entry = {'added_at': self._added_at[key], 'account': acc}
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+        self._saved[key] = acc
+
+    def sync(self, accounts: List[dict]) -> int:
+        """写入有变化的账号并删除已移除的账号文件，返回写入的文件数"""
+        with self._lock:
+            return self._sync(accounts)
+
+    def _sync(self, accounts: List[dict]) -> int:
+        written = 0
+        keys = set()
+        # 账号获取到 mid 后文件名会变化，沿用原来的添加时间保持顺序
+        by_sessdata = {saved.get('sessdata'): key for key, saved in self._saved.items()}
+        for acc in accounts:
+            if not acc:
+                continue
+            key = account_key(acc)
+            keys.add(key)
+            if key not in self._added_at and acc.get('sessdata') in by_sessdata:
+                self._added_at[key] = self._added_at.get(by_sessdata[acc.get('sessdata')], time.time())
+            if self._saved.get(key) != acc:
+                self._write(key, acc)
+                written += 1
+
+        for key in list(self._saved):
+            if key not in keys:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                del self._saved[key]
+                self._added_at.pop(key, None)
+        return written
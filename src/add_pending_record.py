@@ -1,8 +1,29 @@
 import time
-from storage import Storage
+from storage import PendingStore
+from notify import send_command
 from logger import logger
 import os
 
+def add_to_store(storage: PendingStore, title_keyword: str, after_timestamp: int = None) -> bool:
+    """把记录写入 ``storage``，已存在相同记录时返回 ``False``"""
+    # 如果没有提供时间戳，使用当前时间，且不允许重复的标题关键词
+    unique_keyword = after_timestamp is None
+    if after_timestamp is None:
+        after_timestamp = int(time.time())
+    else:
+        after_timestamp = int(after_timestamp)
+
+    # 检查与添加在同一个事务中完成
+    if not storage.add(title_keyword, after_timestamp, unique_keyword=unique_keyword):
+        logger.warning(f"已存在相同的记录: {title_keyword}")
+        return False
+    logger.info(f"成功添加待处理视频: {title_keyword}, 时间戳: {after_timestamp}")
+    return True
+
+def parse_biliup_data(data: dict) -> tuple[str, int]:
+    """从 biliup 后处理传入的JSON中取出房间标题和录制结束时间"""
+    return (data.get('title') or '').strip(), data.get('end_time', 0)
+
 def add_pending_record(title_keyword: str, after_timestamp: int = None):
     """
     添加待处理录播
@@ -15,41 +36,31 @@ def add_pending_record(title_keyword: str, after_timestamp: int = None):
     config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config")
     os.makedirs(config_dir, exist_ok=True)
 
-    storage = Storage(os.path.join(config_dir, 'pending_records.json'))
-    pending_list = storage.load()
+    storage = PendingStore(
+        os.path.join(config_dir, 'pending.db'),
+        legacy_json_path=os.path.join(config_dir, 'pending_records.json')
+    )
+    try:
+        added = add_to_store(storage, title_keyword, after_timestamp)
+    finally:
+        storage.close()
+    if not added:
+        return False
 
-    # 如果没有提供时间戳，使用当前时间
-    if after_timestamp is None:
-        after_timestamp = int(time.time())
-    
-        # 检查是否已存在相同的记录
-        for video in pending_list:
-            if video['title_keyword'] == title_keyword:
-                logger.warning(f"已存在相同标题关键词的记录: {title_keyword}")
-                return False
-    else:
-        after_timestamp = int(after_timestamp)
-    
-    # 添加新记录
-    pending_list.append({
-        'title_keyword': title_keyword,
-        'after_timestamp': after_timestamp
-    })
-    
-    # 保存到文件
-    storage.save(pending_list)
-    logger.info(f"成功添加待处理视频: {title_keyword}, 时间戳: {after_timestamp}")
+    # 通知正在运行的监控立即检查
+    if send_command('wake') is None:
+        logger.info("监控未运行，将在启动后处理该记录")
     return True
 
-def main():
+def main(data: dict = None):
     import sys
     import json
     
     # 从标准输入读取JSON数据
-    data = json.load(sys.stdin)
+    if data is None:
+        data = json.load(sys.stdin)
     
-    room_title = data.get('title', '').strip()
-    after_timestamp = data.get('end_time', 0)
+    room_title, after_timestamp = parse_biliup_data(data)
     
     # 检查room_title是否为空
     if not room_title:
@@ -60,4 +71,4 @@ def main():
     add_pending_record(room_title, after_timestamp)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,19 +1,27 @@
 import json
 import math
+import os
 import random
-from functools import reduce
+import itertools
+import threading
+from functools import lru_cache, reduce
 from hashlib import md5
-import requests
 import time
 import hashlib
-from typing import List, Tuple
-import xml.etree.ElementTree as ET
+from typing import Callable, List, Tuple
 from config import config
 from logger import logger
-import regex
+from http_client import base_url, get_session
+from metrics import metrics
+from danmaku_parser import load_records
+from records import DanmakuRecords, DanmakuType
+from keyword_filter import get_ban_matcher
+from text_cleaner import clean_text
+from sender import RETRY_OUTCOMES, AccountPool, SendOutcome, send_all
+from send_plan import SendPlan, SendProgress, file_fingerprint, plan_path
 import urllib.parse
 
-from cookie_refresh import refresh_all_cookies
+from cookie_refresh import refresh_account
 
 appkey = '1d8b6e7d45233436'
 appsec = '560c52ccd288fed045859ed18bffd973'
@@ -23,6 +31,19 @@ mixinKeyEncTab = [
     61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
     36, 20, 34, 44, 52
 ]
+# 发送弹幕时表示账号 Cookie 失效的消息
+AUTH_FAILED_MESSAGES = ("账号未登录", "csrf校验失败")
+# 风控校验失败、签名错误等需要刷新 WBI 密钥的返回码
+WBI_REJECT_CODES = (-352, -403)
+
+
+class SendIncomplete(Exception):
+    """发送中止时仍有弹幕未发送，XML和待处理记录需要保留"""
+
+    def __init__(self, message: str, remaining: int):
+        super().__init__(message)
+        self.remaining = remaining
+
 
 def appsign(params, appkey, appsec):
     '为请求参数进行 APP 签名'
@@ -64,6 +85,7 @@ def gen_dm_args(params: dict):
 
     return params
 
+@lru_cache(maxsize=8)
 def get_mixin_key(orig: str):
     return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, "")[:32]
 
@@ -97,15 +119,20 @@ def enc_wbi(params: dict, img_key: str, sub_key: str):
     final_query = urllib.parse.urlencode(params)
     return final_query, params
 
-def build_wbi_url(base_url: str, params: dict, headers: dict) -> tuple[str, dict]:
-    img_key, sub_key = get_wbi_keys(headers)
+def build_wbi_url(base_url: str, params: dict, headers: dict, acc: dict | None = None) -> tuple[str, dict]:
+    img_key, sub_key = get_wbi_keys(headers, acc)
     final_query, signed_params = enc_wbi(params, img_key, sub_key)
     full_url = f"{base_url}?{final_query}"
     return full_url, signed_params
 
 
-def get_wbi_keys(headers: dict) -> tuple[str, str]:
-    resp = requests.get("https://api.bilibili.com/x/web-interface/nav", headers=headers)
+# WBI img_key/sub_key 每天轮换，缓存后在有效期内复用
+_wbi_keys: tuple[str, str] | None = None
+_wbi_keys_fetched_at = 0.0
+_wbi_keys_lock = threading.Lock()
+
+def _fetch_wbi_keys(headers: dict, acc: dict | None = None) -> tuple[str, str]:
+    resp = get_session(acc).get(f"{base_url('api')}/x/web-interface/nav", headers=headers, timeout=10)
     resp.raise_for_status()
     json_content = resp.json()
     img_url: str = json_content["data"]["wbi_img"]["img_url"]
@@ -114,17 +141,33 @@ def get_wbi_keys(headers: dict) -> tuple[str, str]:
     sub_key = sub_url.rsplit("/", 1)[1].split(".")[0]
     return img_key, sub_key
 
-def get_signed_params(params: dict, headers: dict):
-    img_key, sub_key = get_wbi_keys(headers)
+def get_wbi_keys(headers: dict, acc: dict | None = None) -> tuple[str, str]:
+    """获取 WBI 密钥，缓存超过 ``bilibili.wbi_key_ttl`` 秒后重新请求"""
+    global _wbi_keys, _wbi_keys_fetched_at
+    ttl = config.bilibili.get('wbi_key_ttl', 3600)
+    with _wbi_keys_lock:
+        if _wbi_keys is None or time.time() - _wbi_keys_fetched_at >= ttl:
+            _wbi_keys = _fetch_wbi_keys(headers, acc)
+            _wbi_keys_fetched_at = time.time()
+        return _wbi_keys
+
+def invalidate_wbi_keys():
+    """清除缓存的 WBI 密钥，下次签名时重新获取"""
+    global _wbi_keys
+    with _wbi_keys_lock:
+        _wbi_keys = None
+
+def get_signed_params(params: dict, headers: dict, acc: dict | None = None):
+    img_key, sub_key = get_wbi_keys(headers, acc)
     return enc_wbi(params, img_key, sub_key)
 
 def get_video_parts_old(bvid: str) -> List[Tuple[int, str, int]]:
     """获取视频分P信息"""
-    url = f"https://api.bilibili.com/x/player/pagelist?bvid={bvid}"
+    url = f"{base_url('api')}/x/player/pagelist?bvid={bvid}"
     headers = {
         'User-Agent': config.bilibili['user_agent']
     }   
-    response = requests.get(url, headers=headers, timeout=10)
+    response = get_session().get(url, headers=headers, timeout=10)
     result = response.json()
     if result["code"] != 0:
         raise Exception(f"获取视频分P失败: {result['message']}")
@@ -132,25 +175,26 @@ def get_video_parts_old(bvid: str) -> List[Tuple[int, str, int]]:
 
 def get_video_parts(mid: int, bvid: str) -> List[Tuple[int, str, int]]:
     """获取视频分P信息"""
-    url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
+    url = f"{base_url('api')}/x/web-interface/view?bvid={bvid}"
     account = next((acc for acc in config.bilibili['accounts'] if acc.get('mid') == mid), None)
     headers = {
         "Cookie": f"SESSDATA={account['sessdata']}; bili_jct={account['csrf']}",
         'User-Agent': config.bilibili['user_agent'],
         "Content-Type": "application/json;charset=UTF-8",
     }
-    response = requests.get(url, headers=headers, timeout=10)
+    response = get_session(account).get(url, headers=headers, timeout=10)
     result = response.json()
     if result["code"] != 0:
         raise Exception(f"获取视频分P失败: {result['message']}")
     return [(item["cid"], item["part"], item['duration']) for item in result["data"]["pages"]]
 
-def send_danmaku(oid: int, message: str, bvid: str, progress: int, color: int, acc: dict) -> tuple[bool, str, dict]:
-    """发送弹幕"""
+def send_danmaku(oid: int, message: str, bvid: str, progress: int, color: int, acc: dict,
+                 retry: bool = True) -> tuple[bool, str, dict]:
+    """发送弹幕，Cookie 失效时刷新该账号并重试一次"""
     if acc.get('expired', False):
         return False, "账号Cookie已过期", {}
     
-    base_url = "https://api.bilibili.com/x/v2/dm/post"
+    post_url = f"{base_url('api')}/x/v2/dm/post"
     
     params = {
         "type": 1,
@@ -165,41 +209,31 @@ def send_danmaku(oid: int, message: str, bvid: str, progress: int, color: int, a
     }
     
     w_rid, wts = get_wbi_sign(params)
-    url = f"{base_url}?web_location=1315873&w_rid={w_rid}&wts={wts}"
+    url = f"{post_url}?web_location=1315873&w_rid={w_rid}&wts={wts}"
     
+    sessdata = acc['sessdata']
     headers = {
         "Content-Type": "application/x-www-form-urlencoded",
-        "Cookie": f"SESSDATA={acc['sessdata']}; bili_jct={acc['csrf']}",
+        "Cookie": f"SESSDATA={sessdata}; bili_jct={acc['csrf']}",
         'User-Agent': config.bilibili['user_agent']
     }
     
     try:
-        response = requests.post(url, data=params, headers=headers, timeout=10)
+        response = get_session(acc).post(url, data=params, headers=headers, timeout=10)
         result = response.json()
         success = result["code"] == 0
-        message = handle_response_code(result["code"])
+        reason = handle_response_code(result["code"])
         
-        # 当遇到登录失效或csrf校验失败时，尝试刷新cookie
-        if result["code"] in [-101, -111]:
-            logger.warning(f"Cookie失效，尝试刷新: {message}")
-            try:
-                new_accounts = refresh_all_cookies()
-            except Exception:
-                logger.exception("刷新Cookie报错")
-                return False, "Cookie刷新失败", {}
-
-            
-            # 如果刷新成功，使用新的cookie重试
-            if new_accounts:
-                for account in new_accounts:
-                    if account['uname'] == acc['uname']:
-                        acc['expired'] = account.get('expired', False)
-                        if acc['expired']:
-                            return False, f"账号{acc['uname']}刷新后Cookie仍然过期", {}
-                        logger.info("使用新的Cookie重试发送弹幕")
-                        return send_danmaku(oid, message, bvid, progress, color, account)
+        # 当遇到登录失效或csrf校验失败时，只刷新当前账号的cookie
+        if result["code"] in [-101, -111] and retry:
+            logger.warning(f"账号{acc['uname']}Cookie失效，尝试刷新: {reason}")
+            if refresh_account(acc, stale_sessdata=sessdata):
+                logger.info("使用新的Cookie重试发送弹幕")
+                return send_danmaku(oid, message, bvid, progress, color, acc, retry=False)
+            if acc.get('expired', False):
+                return False, f"账号{acc['uname']}刷新后Cookie仍然过期", {}
         
-        return success, message, result
+        return success, reason, result
     except Exception as e:
         return False, f"请求发生错误: {str(e)}", {}
 
@@ -222,148 +256,265 @@ def handle_response_code(code: int) -> str:
     }
     return code_messages.get(code, f"未知错误，错误码：{code}")
 
+def _thin_window(normal: List[int], timestamps, max_count: int) -> List[int]:
+    """按时间窗口抽稀普通弹幕，每个窗口保留中间一条
+
+    ``normal`` 为按时间排序的弹幕下标。当剩余弹幕全部保留也不会超过
+    ``max_count`` 时，直接保留剩余全部弹幕。
+    """
+    # 计算时间窗口大小，确保弹幕均匀分布
+    window_size = (timestamps[normal[-1]] - timestamps[normal[0]]) / max_count
+
+    # 使用滑动窗口选择弹幕
+    final_normal: List[int] = []
+    current_window_start = timestamps[normal[0]]
+    window_danmaku: List[int] = []
+
+    for i, idx in enumerate(normal):
+        ts = timestamps[idx]
+        if len(final_normal) + (len(normal) - i) <= max_count:
+            if window_danmaku:
+                mid_idx = len(window_danmaku) // 2
+                final_normal.append(window_danmaku[mid_idx])
+                window_danmaku = []
+            final_normal.extend(normal[i:])
+            break
+
+        while ts > current_window_start + window_size:
+            if window_danmaku:
+                mid_idx = len(window_danmaku) // 2
+                final_normal.append(window_danmaku[mid_idx])
+            window_danmaku = []
+            current_window_start += window_size
+
+        window_danmaku.append(idx)
+
+    if window_danmaku:
+        mid_idx = len(window_danmaku) // 2
+        final_normal.append(window_danmaku[mid_idx])
+    return final_normal
+
+def _thin_window_numpy(normal: List[int], timestamps, max_count: int) -> List[int]:
+    """:func:`_thin_window` 的 NumPy 向量化实现，结果与之完全一致
+
+    窗口边界按与原实现相同的顺序累加得到，用 ``searchsorted`` 为每条弹幕
+    分桶；再根据每个位置之前已产出的窗口数找到"剩余全部保留"的切分点，
+    切分点之前每个非空窗口取中间一条，之后全部保留。
+    """
+    import numpy as np
+
+    idx = np.asarray(normal, dtype=np.int64)
+    ts = np.frombuffer(timestamps, dtype=np.float64)[idx]
+    n = len(idx)
+    start = timestamps[normal[0]]
+    window_size = (timestamps[normal[-1]] - start) / max_count
+
+    # 窗口边界 b[k] = b[k-1] + window_size，cumsum 为顺序累加，浮点误差与逐次相加一致
+    bound_count = max_count + 2
+    while True:
+        steps = np.full(bound_count + 1, window_size)
+        steps[0] = start
+        bounds = np.cumsum(steps)
+        if bounds[-1] >= ts[-1]:
+            break
+        bound_count *= 2
+
+    # 第 k 个窗口包含满足 b[k] < ts <= b[k+1] 的弹幕
+    buckets = np.searchsorted(bounds[1:], ts, side='left')
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+
+    # 处理第 i 条时已产出的窗口数为其之前的窗口数减去当前未结束的窗口
+    positions = np.arange(1, n)
+    emitted = np.searchsorted(run_starts, positions, side='left') - 1
+    fits = np.flatnonzero(emitted + (n - positions) <= max_count)
+    cut = int(positions[fits[0]]) if len(fits) else n
+
+    # 切分点之前的每个窗口取中间一条，切分点之后全部保留
+    starts = run_starts[run_starts < cut]
+    ends = np.append(starts[1:], cut)
+    mids = starts + (ends - starts) // 2
+    return idx[mids].tolist() + idx[cut:].tolist()
+
 def filter_danmaku(
-    danmaku_list: List[Tuple[float, str, str, str, str]],
+    records: DanmakuRecords,
     max_count_per_hour: int = 500,
     max_repeat_count: int = 1,
-) -> List[Tuple[float, str, str]]:
+    use_numpy: bool = False,
+) -> List[int]:
     """根据原始内容过滤弹幕并均匀分布普通弹幕
 
-    ``danmaku_list`` 每项为 ``(timestamp, message, original, type)``，其中
-    ``type`` 为 ``"d"`` 或 ``"gift"``。礼物弹幕不会被计入频率限制或重复
-    限制，但仍会按时间排序返回。
+    返回按时间排序的保留弹幕在 ``records`` 中的下标。礼物弹幕不会被计入
+    频率限制或重复限制，但仍会按时间排序返回。``use_numpy`` 为真且已安装
+    NumPy 时使用向量化的窗口抽稀。
     """
-    if not danmaku_list:
+    if not len(records):
         return []
-    
-    # 从配置中获取禁用关键词列表
-    banned_keywords = config.danmaku.get("ban_keywords", [])
-
-    # 先过滤掉包含禁用关键词的弹幕（礼物弹幕不过滤）
-    danmaku_list = [
-        item
-        for item in danmaku_list
-        if (
-            item[4] == "gift"
-            or (item[2] and not any(k in item[2] for k in banned_keywords))
-        )
-    ]
+
+    # 从配置中获取禁用关键词匹配器
+    ban_matcher = get_ban_matcher(config.danmaku)
+    timestamps = records.timestamps
+    types = records.types
+    contents = records.contents
+    content_pool = records.content_pool
+
+    # 先过滤掉包含禁用关键词的弹幕（礼物弹幕不过滤），相同内容只判断一次
+    allowed: dict[int, bool] = {}
+    kept: List[int] = []
+    for i in range(len(records)):
+        if types[i] != DanmakuType.DANMAKU:
+            kept.append(i)
+            continue
+        cid = contents[i]
+        ok = allowed.get(cid)
+        if ok is None:
+            text = content_pool[cid]
+            ok = allowed[cid] = bool(text) and not ban_matcher.search(text)
+        if ok:
+            kept.append(i)
 
     # 如果全部弹幕均被过滤，则直接返回空列表
-    if not danmaku_list:
+    if not kept:
         return []
 
     # 按时间排序
-    danmaku_list.sort(key=lambda x: x[0])
-    
+    kept.sort(key=timestamps.__getitem__)
+
     # 去重并检查重复次数（礼物弹幕不去重）
-    seen_contents: dict[str, int] = {}
-    unique_danmaku: List[Tuple[float, str, str, str, str]] = []
-    for item in danmaku_list:
-        ts, msg, orig, price, typ = item
-        if typ == "gift":
-            unique_danmaku.append(item)
+    seen_contents: dict[int, int] = {}
+    unique_danmaku: List[int] = []
+    normal_danmaku: List[int] = []
+    for i in kept:
+        if types[i] != DanmakuType.DANMAKU:
+            unique_danmaku.append(i)
             continue
-        seen_contents[orig] = seen_contents.get(orig, 0) + 1
-        if seen_contents[orig] <= max_repeat_count:
-            unique_danmaku.append(item)
+        cid = contents[i]
+        seen_contents[cid] = seen_contents.get(cid, 0) + 1
+        if seen_contents[cid] <= max_repeat_count:
+            unique_danmaku.append(i)
+            normal_danmaku.append(i)
 
-    # 筛选出普通弹幕用于计算频率
-    normal_danmaku = [d for d in unique_danmaku if d[4] != "gift"]
+    # 没有普通弹幕时无需计算频率
     if not normal_danmaku:
-        return [(t, m, typ) for t, m, _, _, typ in unique_danmaku]
+        return unique_danmaku
 
     # 获取视频总时长（小时）
-    video_duration = danmaku_list[-1][0] / 3600
-    
+    video_duration = timestamps[kept[-1]] / 3600
+
     # 计算实际每小时最大弹幕数
     max_count = int(max_count_per_hour * video_duration)
     if max_count == 0:
         return []
-    
+
     # 如果去重后数量小于限制，直接返回
     if len(normal_danmaku) <= max_count:
         final_normal = normal_danmaku
     else:
-        # 计算时间窗口大小，确保弹幕均匀分布
-        window_size = (normal_danmaku[-1][0] - normal_danmaku[0][0]) / max_count
-
-        # 使用滑动窗口选择弹幕
-        final_normal: List[Tuple[float, str, str, str, str]] = []
-        current_window_start = normal_danmaku[0][0]
-        window_danmaku: List[Tuple[float, str, str, str, str]] = []
-
-        for i, item in enumerate(normal_danmaku):
-            ts = item[0]
-            if len(final_normal) + (len(normal_danmaku) - i) <= max_count:
-                if window_danmaku:
-                    mid_idx = len(window_danmaku) // 2
-                    final_normal.append(window_danmaku[mid_idx])
-                    window_danmaku = []
-                final_normal.extend(normal_danmaku[i:])
-                break
+        thin = _thin_window
+        if use_numpy:
+            try:
+                import numpy  # noqa: F401
+                thin = _thin_window_numpy
+            except ImportError:
+                logger.warning("未安装 numpy，使用纯 Python 窗口抽稀")
+        final_normal = thin(normal_danmaku, timestamps, max_count)
 
-            while ts > current_window_start + window_size:
-                if window_danmaku:
-                    mid_idx = len(window_danmaku) // 2
-                    final_normal.append(window_danmaku[mid_idx])
-                window_danmaku = []
-                current_window_start += window_size
+    # 礼物弹幕保持原顺序加入
+    gifts = [i for i in unique_danmaku if types[i] != DanmakuType.DANMAKU]
+    result = final_normal + gifts
+    result.sort(key=timestamps.__getitem__)
+    return result
 
-            window_danmaku.append(item)
 
-        if window_danmaku:
-            mid_idx = len(window_danmaku) // 2
-            final_normal.append(window_danmaku[mid_idx])
+def plan_source(xml_path: str) -> str:
+    """发送计划的来源标识：XML文件指纹加上影响过滤结果的配置"""
+    filter_config = json.dumps([
+        config.danmaku['max_count_per_hour'],
+        config.danmaku['max_repeat_count'],
+        config.danmaku.get('ban_keywords') or [],
+        config.danmaku.get('ban_keywords_ignore_case', False),
+    ], ensure_ascii=False, sort_keys=True)
+    return f"{file_fingerprint(xml_path)}|{md5(filter_config.encode('utf-8')).hexdigest()[:16]}"
+
+
+def build_send_plan(xml_path: str, source: str = '') -> SendPlan:
+    """解析、过滤并清洗XML文件中的弹幕，生成发送计划"""
+    # 流式读取XML文件到列式容器
+    with metrics.timed('parse'):
+        records = load_records(xml_path)
+
+    # 过滤和均匀分布弹幕
+    with metrics.timed('filter'):
+        filtered_danmaku = filter_danmaku(
+            records,
+            max_count_per_hour=config.danmaku['max_count_per_hour'],
+            max_repeat_count=config.danmaku['max_repeat_count'],
+            use_numpy=config.danmaku.get('use_numpy', False)
+        )
+    logger.info(f"原始弹幕数量: {len(records)}, 过滤后数量: {len(filtered_danmaku)}")
+
+    with metrics.timed('clean'):
+        return SendPlan.build(
+            timestamps=[records.timestamps[i] for i in filtered_danmaku],
+            colors=[16776960 if records.is_gift(i) else 16777215 for i in filtered_danmaku],
+            messages=[clean_text(records.message(i)) for i in filtered_danmaku],
+            earnings=records.total_price(),
+            source=source
+        )
+
+
+_plan_locks: dict[str, threading.Lock] = {}
+_plan_locks_guard = threading.Lock()
 
-    # 礼物弹幕保持原顺序加入
-    gifts = [d for d in unique_danmaku if d[4] == "gift"]
-    result = final_normal + gifts
-    result.sort(key=lambda x: x[0])
 
-    return [(ts, msg, tpe) for ts, msg, _, _, tpe in result]
+def _plan_lock(xml_path: str) -> threading.Lock:
+    with _plan_locks_guard:
+        return _plan_locks.setdefault(os.path.abspath(xml_path), threading.Lock())
 
 
-def _parse_gift(elem: ET.Element, base_timestamp: float | None) -> tuple[float, str, str, str, str] | None:
-    """将礼物弹幕元素转换为时间戳和消息文本
+def prepare_send_plan(xml_path: str, in_progress: Callable[[str], bool] | None = None) -> bool:
+    """预先生成XML对应的发送计划，已是最新时不做任何事，返回是否新生成了计划
 
-    返回 ``(time, message, original_content, 'gift')``，若 ``base_timestamp`` 未确定则返回 ``None``。
+    ``in_progress(source)`` 返回已保存的计划是否有未完成的发送进度，有时保留
+    该计划，不因过滤配置变化而重新生成。
     """
-    since_start = elem.get('since_start')
-    if since_start is not None:
-        time_stamp = float(since_start)
-    elif base_timestamp is not None:
-        abs_time = float(elem.get('timestamp', '0'))
-        time_stamp = abs_time - base_timestamp
-    else:
-        return None
-    uname = elem.get('username', elem.get('user', ''))
-    uid = elem.get('uid', '')
-    giftname = elem.get('giftname', '')
-    price = elem.get('price', '0')
-    num = elem.get('num', '0')
-    total_price = str(int(price) * int(num))
-    message = f"{uname}({uid}) donate {giftname} x{num}"
-    if giftname.startswith("点亮"):
-        message = f"{uname}({uid}) {giftname}"
-    original = f"{giftname} x{num}"
-    return time_stamp, message, original, total_price, "gift"
-
-
-def _flush_gifts(
-    pending_gifts: List[ET.Element],
-    base_timestamp: float,
-    danmaku_list: List[Tuple[float, str, str, str, str]],
-) -> None:
-    """将缓存的礼物弹幕转换为普通弹幕格式并加入列表"""
-    for g in pending_gifts:
-        parsed = _parse_gift(g, base_timestamp)
-        if parsed is not None:
-            danmaku_list.append(parsed)
-    pending_gifts.clear()
-
-
-def auto_send_danmaku(xml_path: str, video_cid: int, video_duration: int, bvid: str, is_self_view: bool):
+    with _plan_lock(xml_path):
+        source = plan_source(xml_path)
+        path = plan_path(xml_path)
+        saved = SendPlan.read_source(path)
+        if saved == source or (saved is not None and in_progress is not None and in_progress(saved)):
+            return False
+        plan = build_send_plan(xml_path, source)
+        plan.save(path)
+        return True
+
+
+def load_send_plan(xml_path: str, resume_source: str | None = None) -> SendPlan:
+    """读取XML对应的发送计划，计划不存在、XML或过滤配置变化时重新生成并保存
+
+    ``resume_source`` 为已保存的发送进度对应的计划来源，与已保存的计划相同
+    时直接使用该计划继续发送，即使过滤配置已经变化。
+    """
+    with _plan_lock(xml_path):
+        source = plan_source(xml_path)
+        path = plan_path(xml_path)
+        plan = SendPlan.load(path)
+        if plan is not None and plan.source == source:
+            logger.info(f"使用已保存的发送计划: {path}")
+            return plan
+        if plan is not None and plan.source == resume_source:
+            logger.info(f"继续使用中断前的发送计划，过滤配置的变化从下一个分P开始生效: {path}")
+            return plan
+
+        plan = build_send_plan(xml_path, source)
+        try:
+            plan.save(path)
+        except OSError:
+            logger.exception(f"保存发送计划失败: {path}")
+        return plan
+
+
+def auto_send_danmaku(xml_path: str, video_cid: int, video_duration: int, bvid: str, is_self_view: bool,
+                      pool: AccountPool | None = None, store=None):
     """根据XML文件内容自动发送弹幕
 
     XML中 ``<d>`` 标签表示普通弹幕，``<s type="gift">`` 表示礼物弹幕。
@@ -371,148 +522,111 @@ def auto_send_danmaku(xml_path: str, video_cid: int, video_duration: int, bvid:
     若没有该字段，则通过 ``timestamp`` 与普通弹幕推算基准时间。
     普通弹幕会封装为 ``[用户名]([用户id])：[内容]``，礼物弹幕会封装为
     ``[用户名]([用户id]) donate [礼物名称] x[礼物数量]``。
-    
+
+    ``pool`` 为多个发送任务共用的账号池，不传时单独创建。``store`` 为
+    :class:`storage.PendingStore`，传入时按 ``(bvid, cid)`` 保存发送进度，
+    中断后再次调用会跳过已发送成功的弹幕。结束时仍有弹幕需要发送（没有
+    可用账号，或多次重试仍被限速、网络错误）时抛出 :class:`SendIncomplete`，
+    已保存的进度保留，下次调用只发送这些弹幕。
     """
     
     start_time = time.time()  # 记录开始时间
     
-    # 读取XML文件
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    danmaku_list: List[Tuple[float, str, str, str, str]] = []
-    base_timestamp = None  # 视频开始的 Unix 时间戳
-    pending_gifts: List[ET.Element] = []
-
-    # 收集所有弹幕
-    for elem in root:
-        if elem.tag == 'd':
-            # 普通弹幕
-            p_attr = elem.get('p')
-            rel_time = float(p_attr.split(',')[0]) if p_attr else 0.0
-            abs_time = float(elem.get('timestamp', '0'))
-
-            if base_timestamp is None:
-                base_timestamp = abs_time - rel_time
-                _flush_gifts(pending_gifts, base_timestamp, danmaku_list)
-
-            time_stamp = rel_time if p_attr else abs_time - base_timestamp
-
-            content = elem.text or ""
-            uname = elem.get('user', '')
-            uid = elem.get('uid', '')
-            if uname == '' or uid == '':
-                message = content
-            else:
-                message = f"{uname}({uid})：{content}"
-            danmaku_list.append((time_stamp, message, content, "0", "d"))
-
-
-        elif elem.tag == 's' and elem.get('type') == 'gift':
-            parsed = _parse_gift(elem, base_timestamp)
-            if parsed is None:
-                pending_gifts.append(elem)
-            else:
-                danmaku_list.append(parsed)
-
-    # 若遍历结束后仍未确定基准时间，使用最早礼物弹幕时间作为基准
-    if pending_gifts:
-        if base_timestamp is None:
-            base_timestamp = float(pending_gifts[0].get('timestamp', '0'))
-        _flush_gifts(pending_gifts, base_timestamp, danmaku_list)
-    
-    # 计算礼物收益
-    earnings = sum(int(item[3]) for item in danmaku_list)
-
-    # 过滤和均匀分布弹幕
-    filtered_danmaku = filter_danmaku(
-        danmaku_list,
-        max_count_per_hour=config.danmaku['max_count_per_hour'],
-        max_repeat_count=config.danmaku['max_repeat_count']
-    )
-    
-    logger.info(f"原始弹幕数量: {len(danmaku_list)}, 过滤后数量: {len(filtered_danmaku)}")
+    # 解析过滤后的发送计划，已保存过时直接读取；有发送进度时沿用中断前的计划
+    saved = store.get_progress(bvid, video_cid) if store is not None else None
+    plan = load_send_plan(xml_path, saved[0] if saved is not None else None)
+    earnings = plan.earnings
+
+    # 恢复发送进度
+    save = None
+    watermark, ahead, retry = 0, [], []
+    if store is not None:
+        if saved is not None and saved[0] == plan.source:
+            _, watermark, ahead, retry = saved
+        save = lambda w, a, r: store.save_progress(bvid, video_cid, plan.source, w, a, r)
+    progress = SendProgress(len(plan), watermark, ahead, retry, save=save)
+    todo = progress.remaining()
+    if progress.done_count:
+        logger.info(f"从上次中断处继续发送，已完成 {progress.done_count}/{len(plan)} 条")
     
     # 发送弹幕
-    rate_limit_wait = config.danmaku['send_interval']  # 初始等待时间
-    # 过滤expired的账号
-    accounts = [acc for acc in config.bilibili['accounts'] if not acc.get('expired', False)]
-    batch_size = config.bilibili['batch_size']  # 每批账号数量
+    concurrency = config.bilibili['batch_size']  # 同时发送的请求数
+    accept = None
+    if pool is None:
+        pool = AccountPool(config.bilibili['accounts'], send_interval=config.danmaku['send_interval'])
+    else:
+        pool.sync(config.bilibili['accounts'])
     if is_self_view:
-        accounts = [next((acc for acc in config.bilibili['accounts'] if acc.get('mid') == config.monitor['mid']), None)]
-        batch_size = 1
-    success_streak = 0  # 连续成功的批次数
-    danmaku_count = 0
-    
-    # 将账号分批
-    account_batches = [accounts[i:i+batch_size] for i in range(0, len(accounts), batch_size)]
-    current_batch = 0
-    
-    for i in range(0, len(filtered_danmaku), batch_size):
-        batch_danmaku = filtered_danmaku[i:i+batch_size]
-        current_accounts = account_batches[current_batch]
-        rate_limited = False
-        
-        # 计算批量账号里面的名字最长的名字个数，名字里面的中文算两个长度
-        max_name_length = max(len(account['uname']) + sum(1 for c in account['uname'] if ord(c) > 127) for account in current_accounts)
-
-        # 并行发送当前批次的弹幕
-        for j, (timestamp, content, tpe) in enumerate(batch_danmaku):
-            progress = max(
-                min(int(timestamp * 1000) - 3000, video_duration * 1000),
-                0
-            )
-            account_index = j % len(current_accounts)
-            current_account = current_accounts[account_index]
-            color = 16776960 if tpe == 'gift' else 16777215
-            success, message, result = send_danmaku(
-                oid=video_cid,
-                bvid=bvid,
-                message=clean_text(content),
-                progress=progress,
-                color=color,
-                acc=current_account
-            )
-            
-
-            # Adjust padding for names with mixed characters (including Chinese)
-            adjusted_name = current_account['uname']
-            padding_length = max_name_length - len(adjusted_name) - sum(1 for c in adjusted_name if ord(c) > 127)
-            logger.info(f"({danmaku_count+j+1}/{len(filtered_danmaku)}) {adjusted_name}{' ' * (padding_length + 5)}(Lv{current_account['level']}) 发送弹幕: ({time.strftime('%H:%M:%S', time.gmtime(progress / 1000))}) {content}")
-            
-            if not success:
-                if message in ["账号未登录", "csrf校验失败"]:
-                    # 如果是cookie失效，跳过这个账号
-                    continue
-                    
-                if "发送频率过快" in message:
-                    rate_limited = True
-                    break
-                else:
-                    logger.warning(f"状态: 失败, 消息: {message}")  
-        
-        danmaku_count += len(batch_danmaku)
-        
-        # 处理频率限制情况
-        if rate_limited:
-            if len(account_batches) == 1:
-                # 只有一个批次时，直接增加等待时间
-                rate_limit_wait = min(int(rate_limit_wait * 2), 60)  # 最大等待时间60秒
-                logger.warning(f"频率限制，等待时间增加到 {rate_limit_wait} 秒")
-            else:
-                # 多个批次时，先检查成功次数
-                if success_streak < 5:
-                    logger.warning(f"成功次数过少({success_streak}次)，歇一下 60 秒")
-                    time.sleep(60)
-                # 切换到下一批账号
-                current_batch = (current_batch + 1) % len(account_batches)
-                logger.info(f"切换到第 {current_batch + 1} 批账号")
-            success_streak = 0  # 重置连续成功计数
-        else:
-            success_streak += 1
-            rate_limit_wait = max(int(rate_limit_wait * 0.8), config.danmaku['send_interval'])
-        
-        time.sleep(rate_limit_wait)
-    
+        # 仅自己可见的视频只能由UP主本人的账号发送
+        up_mid = config.monitor['mid']
+        accept = lambda acc: acc.get('mid') == up_mid
+        concurrency = 1
+    states = [s for s in pool.states if s.usable and (accept is None or accept(s.acc))]
+    if not states:
+        raise SendIncomplete("没有可用的发送账号", len(todo))
+
+    # 计算账号里面的名字最长的名字个数，名字里面的中文算两个长度
+    max_name_length = max(len(s.acc['uname']) + sum(1 for c in s.acc['uname'] if ord(c) > 127) for s in states)
+    sent_count = itertools.count(progress.done_count + 1)
+
+    def send_one(n: int, acc: dict) -> SendOutcome:
+        idx = todo[n]
+        content = plan.message(idx)
+        position = max(
+            min(int(plan.timestamps[idx] * 1000) - 3000, video_duration * 1000),
+            0
+        )
+        success, message, result = send_danmaku(
+            oid=video_cid,
+            bvid=bvid,
+            message=content,
+            progress=position,
+            color=plan.colors[idx],
+            acc=acc
+        )
+
+        # Adjust padding for names with mixed characters (including Chinese)
+        adjusted_name = acc['uname']
+        padding_length = max_name_length - len(adjusted_name) - sum(1 for c in adjusted_name if ord(c) > 127)
+        logger.info(f"({next(sent_count)}/{len(plan)}) {adjusted_name}{' ' * (padding_length + 5)}(Lv{acc['level']}) 发送弹幕: ({time.strftime('%H:%M:%S', time.gmtime(position / 1000))}) {content}")
+
+        if success:
+            return SendOutcome.OK
+        if "发送频率过快" in message:
+            return SendOutcome.RATE_LIMITED
+        if message in AUTH_FAILED_MESSAGES or "Cookie" in message:
+            # 如果是cookie失效，换一个账号发送
+            return SendOutcome.AUTH_FAILED
+        if message.startswith("请求发生错误"):
+            logger.warning(f"状态: 失败, 消息: {message}")
+            return SendOutcome.ERROR
+        logger.warning(f"状态: 失败, 消息: {message}")
+        return SendOutcome.FAILED
+
+    def on_done(n: int, outcome: SendOutcome):
+        # 发送成功和不可重试的失败不再发送，重试次数用尽的下次继续尝试，因没有账号而放弃的保持未发送
+        if outcome in (SendOutcome.OK, SendOutcome.FAILED):
+            progress.mark_done(todo[n])
+        elif outcome in RETRY_OUTCOMES:
+            progress.mark_retry(todo[n])
+        metrics.set('bilibili_send_done', progress.done_count, bvid=bvid, cid=video_cid)
+
+    metrics.set('bilibili_send_total', len(plan), bvid=bvid, cid=video_cid)
+    metrics.set('bilibili_send_done', progress.done_count, bvid=bvid, cid=video_cid)
+    try:
+        with metrics.timed('send'):
+            stats = send_all(pool, len(todo), send_one, concurrency,
+                             max_retries=config.monitor.get('max_retries', 3), on_done=on_done, accept=accept)
+    finally:
+        progress.flush()
+    logger.info(f"发送成功 {stats[SendOutcome.OK]} 条，失败 {stats[SendOutcome.FAILED]} 条，"
+                f"频率限制 {stats[SendOutcome.RATE_LIMITED]} 条，账号失效 {stats[SendOutcome.AUTH_FAILED]} 条，"
+                f"网络错误 {stats[SendOutcome.ERROR]} 条")
+    left = len(progress.remaining())
+    if left:
+        reason = "没有可用的发送账号" if stats[SendOutcome.ABANDONED] else "多次重试后仍未发送成功"
+        raise SendIncomplete(f"{reason}，剩余 {left} 条弹幕未发送", left)
+
     # 计算并打印总耗时
     total_time = time.time() - start_time
     hours = int(total_time // 3600)
@@ -522,6 +636,23 @@ def auto_send_danmaku(xml_path: str, video_cid: int, video_duration: int, bvid:
     logger.info(f"弹幕发送完成，总耗时: {hours:02d}:{minutes:02d}:{seconds:02d}，主播挣了：{earnings}")
     return earnings
 
+def pick_closest_video(vlist: List[dict], title_keyword: str, after_timestamp: int, time_key: str = "created") -> dict | None:
+    """从视频列表中找出标题包含关键词且发布时间晚于并最接近 ``after_timestamp`` 的视频"""
+    closest_video = None
+    min_time_diff = float('inf')
+
+    # 遍历视频列表找出时间最接近的视频
+    for video in vlist:
+        # 只考虑发布时间晚于after_timestamp的视频
+        if video[time_key] <= after_timestamp:
+            continue
+
+        time_diff = video[time_key] - after_timestamp
+        if time_diff < min_time_diff and title_keyword.lower() in video["title"].lower():
+            min_time_diff = time_diff
+            closest_video = video
+    return closest_video
+
 def check_up_latest_video_old(mid: int, title_keyword: str, after_timestamp: int) -> str:
     """
     检查UP主最新视频
@@ -547,7 +678,7 @@ def check_up_latest_video_old(mid: int, title_keyword: str, after_timestamp: int
     url = f"https://app.bilibili.com/x/v2/space/archive/cursor?{query}"
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_session().get(url, headers=headers, timeout=10)
         result = response.json()
         if result["code"] != 0:
             logger.exception(f"请求失败: {result['message']}")
@@ -555,26 +686,43 @@ def check_up_latest_video_old(mid: int, title_keyword: str, after_timestamp: int
         
         # 获取视频列表
         vlist = result["data"]["item"]
-        closest_video = None
-        min_time_diff = float('inf')
-        
-        # 遍历视频列表找出时间最接近的视频
-        for video in vlist:
-            # 只考虑发布时间晚于after_timestamp的视频
-            if video["ctime"] <= after_timestamp:
-                continue
-                
-            time_diff = video["ctime"] - after_timestamp
-            if time_diff < min_time_diff and title_keyword.lower() in video["title"].lower():
-                min_time_diff = time_diff
-                closest_video = video
-        
+        closest_video = pick_closest_video(vlist, title_keyword, after_timestamp, time_key="ctime")
         return closest_video["bvid"] if closest_video else ""
         
     except Exception as e:
         logger.exception(f"请求发生错误")
         return ""
     
+def _arc_search(account: dict, params: dict) -> dict:
+    """以 ``account`` 的身份请求 ``wbi/arc/search``，签名被拒绝时刷新密钥重试一次"""
+    headers = {
+        "Cookie": f"SESSDATA={account['sessdata']}; bili_jct={account['csrf']}",
+        'User-Agent': config.bilibili['user_agent'],
+        "Content-Type": "application/json;charset=UTF-8",
+    }
+
+    params = gen_dm_args(params)
+    
+    search_url = f"{base_url('api')}/x/space/wbi/arc/search"
+
+    for attempt in range(2):
+        full_url, signed_params = build_wbi_url(search_url, params, headers, account)
+        logger.info("full_url=%s", full_url)
+
+        response = get_session(account).get(full_url, headers=headers, timeout=10)
+        result = response.json()
+
+        # 签名被拒绝时可能是密钥已轮换，刷新密钥后重试一次
+        if result["code"] in WBI_REJECT_CODES and attempt == 0:
+            logger.warning("WBI签名被拒绝(code=%s)，刷新密钥后重试", result["code"])
+            invalidate_wbi_keys()
+            continue
+        break
+
+    if result["code"] != 0:
+        logger.error("请求失败: code=%s message=%s url=%s", result.get("code"), result.get("message"), full_url)
+    return result
+
 def check_up_latest_video(mid: int, title_keyword: str, after_timestamp: int) -> (str, bool):
     params = {
         "mid": mid,
@@ -587,44 +735,16 @@ def check_up_latest_video(mid: int, title_keyword: str, after_timestamp: int) ->
     if not account:
         logger.warning('由于没有被监听up的cookie，无法监听私有视频！')
         return check_up_latest_video_old(mid, title_keyword, after_timestamp), False
-    
-    headers = {
-        "Cookie": f"SESSDATA={account['sessdata']}; bili_jct={account['csrf']}",
-        'User-Agent': config.bilibili['user_agent'],
-        "Content-Type": "application/json;charset=UTF-8",
-    }
-
-    params = gen_dm_args(params)
-    
-    base_url = f"https://api.bilibili.com/x/space/wbi/arc/search"
 
     try:
-        full_url, signed_params = build_wbi_url(base_url, params, headers)
-        logger.info("full_url=%s", full_url)
-
-        response = requests.get(full_url, headers=headers)
-        result = response.json()
-        
+        result = _arc_search(account, params)
         if result["code"] != 0:
-            logger.error("请求失败: code=%s message=%s url=%s", result.get("code"), result.get("message"), full_url)
-            refresh_all_cookies()
+            refresh_account(account)
             return "", False
 
         # 获取视频列表
         vlist = (((result.get("data") or {}).get("list") or {}).get("vlist")) or []
-        closest_video = None
-        min_time_diff = float('inf')
-
-        # 遍历视频列表找出时间最接近的视频
-        for video in vlist:
-            # 只考虑发布时间晚于after_timestamp的视频
-            if video["created"] <= after_timestamp:
-                continue
-
-            time_diff = video["created"] - after_timestamp
-            if time_diff < min_time_diff and title_keyword.lower() in video["title"].lower():
-                min_time_diff = time_diff
-                closest_video = video
+        closest_video = pick_closest_video(vlist, title_keyword, after_timestamp)
         if closest_video:
             return closest_video.get("bvid", ""), closest_video.get("is_self_view", False)
         return "", False
@@ -632,8 +752,58 @@ def check_up_latest_video(mid: int, title_keyword: str, after_timestamp: int) ->
         logger.exception(f"请求发生错误")
         return "", False
 
-def clean_text(text):
-    return ''.join(c for c in text if regex.match(r'[\p{Han}\p{Latin}0-9\s.,!?？。，！；（）：‘’【】、;:\'"\-()（）\[\]{}…—·~`@#&*+=<>%$^|\\/]', c))
+def get_up_recent_videos(mid: int, after_timestamp: int, page_size: int = 30, max_pages: int = 5) -> List[dict] | None:
+    """获取UP主发布时间晚于 ``after_timestamp`` 的视频，按发布时间倒序
+
+    不带关键词按页拉取投稿列表，直到出现早于 ``after_timestamp`` 的视频或
+    达到 ``max_pages`` 页。每个视频为 ``{'bvid', 'title', 'created',
+    'is_self_view'}``。没有UP主账号时退回公开的 APP 接口，只取第一页。
+    请求失败返回 ``None``。
+    """
+    account = next((acc for acc in config.bilibili['accounts'] if acc.get('mid') == mid), None)
+    videos: List[dict] = []
+
+    try:
+        if not account:
+            logger.warning('由于没有被监听up的cookie，无法监听私有视频！')
+            params = appsign({'vmid': mid, 'order': 'pubdate', 'ts': int(time.time())}, appkey, appsec)
+            url = f"https://app.bilibili.com/x/v2/space/archive/cursor?{urllib.parse.urlencode(params)}"
+            response = get_session().get(url, headers={'User-Agent': config.bilibili['user_agent']}, timeout=10)
+            result = response.json()
+            if result["code"] != 0:
+                logger.error(f"请求失败: {result.get('message')}")
+                return None
+            for item in result["data"]["item"] or []:
+                if item["ctime"] > after_timestamp:
+                    videos.append({'bvid': item["bvid"], 'title': item["title"],
+                                   'created': item["ctime"], 'is_self_view': False})
+            return videos
+
+        for pn in range(1, max_pages + 1):
+            result = _arc_search(account, {"mid": mid, "ps": page_size, "pn": pn, "order": "pubdate"})
+            if result["code"] != 0:
+                refresh_account(account)
+                return None
+            vlist = (((result.get("data") or {}).get("list") or {}).get("vlist")) or []
+            for item in vlist:
+                if item["created"] > after_timestamp:
+                    videos.append({'bvid': item.get("bvid", ""), 'title': item["title"],
+                                   'created': item["created"], 'is_self_view': item.get("is_self_view", False)})
+            if len(vlist) < page_size or vlist[-1]["created"] <= after_timestamp:
+                break
+        return videos
+    except Exception:
+        logger.exception("请求发生错误")
+        return None
+
+def match_pending_videos(videos: List[dict], pending_list: List[dict]) -> List[tuple[dict, dict]]:
+    """在本地将待处理记录与视频列表逐一匹配，返回 ``(记录, 视频)``"""
+    matched = []
+    for record in pending_list:
+        video = pick_closest_video(videos, record['title_keyword'], record['after_timestamp'])
+        if video:
+            matched.append((record, video))
+    return matched
 
 if __name__ == '__main__':
     bvid, is_self_view = check_up_latest_video(2054591624, '冠军打野 一打五', 1767295829)
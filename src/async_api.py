@@ -0,0 +1,201 @@
+"""基于 asyncio 的B站 API 客户端
+
+与 ``api``/``cookie_refresh``/``login`` 中的同步函数一一对应，签名、
+返回值格式保持一致，便于在同一个事件循环中同时轮询多个 UP 主、驱动多个
+发送账号。所有请求共用一个带连接池的 ``aiohttp.ClientSession``，Cookie
+通过请求头显式传入。接口地址默认与同步版本一样取自 ``bilibili.api_base``，
+请求同样记录到 :data:`metrics.metrics`。Cookie 失效时在线程中调用
+:func:`cookie_refresh.refresh_account`，与同步版本共用同一套刷新和保存逻辑。
+
+aiohttp 为可选依赖，使用本模块前需额外安装: pip install aiohttp
+"""
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError as e:
+    raise ImportError("async_api 需要额外安装 aiohttp: pip install aiohttp") from e
+
+from api import (
+    WBI_REJECT_CODES, enc_wbi, gen_dm_args, get_wbi_sign, handle_response_code, pick_closest_video,
+)
+from config import config
+from cookie_refresh import refresh_account
+from http_client import account_label, base_url, endpoint_label
+from logger import logger
+from metrics import metrics
+
+
+def _cookie_header(acc: dict) -> str:
+    return f"SESSDATA={acc['sessdata']}; bili_jct={acc['csrf']}"
+
+
+class AsyncBilibiliClient:
+    """异步B站 API 客户端，需在事件循环中使用 ``async with`` 创建"""
+
+    def __init__(
+        self,
+        api_base: Optional[str] = None,
+        timeout: float = 10,
+        limit: int = 100,
+        limit_per_host: int = 30,
+    ):
+        self.api_base = (api_base or base_url('api')).rstrip('/')
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._wbi_keys: Optional[Tuple[str, str]] = None
+        self._wbi_keys_fetched_at = 0.0
+        self._wbi_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self._limit, limit_per_host=self._limit_per_host),
+            timeout=self._timeout,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _headers(self, acc: Optional[dict] = None, **extra) -> dict:
+        headers = {'User-Agent': config.bilibili['user_agent']}
+        if acc:
+            headers['Cookie'] = _cookie_header(acc)
+        headers.update(extra)
+        return headers
+
+    async def _request_json(self, method: str, url: str, headers: dict, acc: Optional[dict] = None,
+                            **kwargs) -> dict:
+        """发送请求并返回JSON，耗时和返回码记录到运行指标"""
+        start = time.perf_counter()
+        code = 'error'
+        try:
+            async with self._session.request(method, url, headers=headers, **kwargs) as resp:
+                result = await resp.json(content_type=None)
+                code = str(result.get('code')) if isinstance(result, dict) else str(resp.status)
+                return result
+        finally:
+            metrics.observe_request(endpoint_label(url), account_label(acc), time.perf_counter() - start, code)
+
+    async def _get_json(self, url: str, headers: dict, acc: Optional[dict] = None, **kwargs) -> dict:
+        return await self._request_json('GET', url, headers, acc, **kwargs)
+
+    async def get_user_info(self, sessdata: str) -> tuple[bool, dict]:
+        """获取用户信息"""
+        headers = self._headers(Cookie=f'SESSDATA={sessdata}')
+        try:
+            data = await self._get_json(f"{self.api_base}/x/web-interface/nav", headers)
+            if data['code'] != 0:
+                return False, {}
+            user_data = data['data']
+            return True, {
+                'mid': user_data['mid'],
+                'uname': user_data['uname'],
+                'level': user_data['level_info']['current_level']
+            }
+        except Exception as e:
+            logger.error(f"获取用户信息失败: {str(e)}")
+            return False, {}
+
+    async def get_wbi_keys(self, acc: Optional[dict] = None, force: bool = False) -> tuple[str, str]:
+        """获取 WBI 密钥，缓存 ``bilibili.wbi_key_ttl`` 秒"""
+        ttl = config.bilibili.get('wbi_key_ttl', 3600)
+        async with self._wbi_lock:
+            if force or self._wbi_keys is None or time.time() - self._wbi_keys_fetched_at >= ttl:
+                data = await self._get_json(f"{self.api_base}/x/web-interface/nav", self._headers(acc), acc)
+                img_url: str = data["data"]["wbi_img"]["img_url"]
+                sub_url: str = data["data"]["wbi_img"]["sub_url"]
+                self._wbi_keys = (img_url.rsplit("/", 1)[1].split(".")[0], sub_url.rsplit("/", 1)[1].split(".")[0])
+                self._wbi_keys_fetched_at = time.time()
+            return self._wbi_keys
+
+    async def get_video_parts(self, acc: dict, bvid: str) -> List[Tuple[int, str, int]]:
+        """获取视频分P信息"""
+        headers = self._headers(acc, **{"Content-Type": "application/json;charset=UTF-8"})
+        result = await self._get_json(f"{self.api_base}/x/web-interface/view", headers, acc, params={'bvid': bvid})
+        if result["code"] != 0:
+            raise Exception(f"获取视频分P失败: {result['message']}")
+        return [(item["cid"], item["part"], item['duration']) for item in result["data"]["pages"]]
+
+    async def send_danmaku(self, oid: int, message: str, bvid: str, progress: int, color: int, acc: dict,
+                           retry: bool = True) -> tuple[bool, str, dict]:
+        """发送弹幕，Cookie 失效时刷新该账号并就地更新 ``acc`` 后重试一次"""
+        if acc.get('expired', False):
+            return False, "账号Cookie已过期", {}
+
+        params = {
+            "type": 1,
+            "oid": oid,
+            "msg": message,
+            "bvid": bvid,
+            "progress": progress,
+            "color": color,
+            "mode": 1,
+            "rnd": int(time.time() * 1000000),
+            "csrf": acc['csrf']
+        }
+        w_rid, wts = get_wbi_sign(params)
+        url = f"{self.api_base}/x/v2/dm/post?web_location=1315873&w_rid={w_rid}&wts={wts}"
+        headers = self._headers(acc, **{"Content-Type": "application/x-www-form-urlencoded"})
+        sessdata = acc['sessdata']
+
+        try:
+            result = await self._request_json('POST', url, headers, acc, data=params)
+            success = result["code"] == 0
+            reason = handle_response_code(result["code"])
+
+            # 当遇到登录失效或csrf校验失败时，只刷新当前账号的cookie
+            if result["code"] in [-101, -111] and retry:
+                logger.warning(f"账号{acc['uname']}Cookie失效，尝试刷新: {reason}")
+                if await asyncio.to_thread(refresh_account, acc, sessdata):
+                    logger.info("使用新的Cookie重试发送弹幕")
+                    return await self.send_danmaku(oid, message, bvid, progress, color, acc, retry=False)
+                if acc.get('expired', False):
+                    return False, f"账号{acc['uname']}刷新后Cookie仍然过期", {}
+
+            return success, reason, result
+        except Exception as e:
+            return False, f"请求发生错误: {str(e)}", {}
+
+    async def check_up_latest_video(self, acc: dict, mid: int, title_keyword: str, after_timestamp: int) -> tuple[str, bool]:
+        """检查UP主是否发布了符合条件的视频，返回 ``(bvid, is_self_view)``"""
+        params = gen_dm_args({
+            "mid": mid,
+            "ps": 10,
+            "pn": 1,
+            "order": "pubdate",
+            'keyword': title_keyword,
+        })
+        headers = self._headers(acc, **{"Content-Type": "application/json;charset=UTF-8"})
+        search_url = f"{self.api_base}/x/space/wbi/arc/search"
+
+        try:
+            for attempt in range(2):
+                img_key, sub_key = await self.get_wbi_keys(acc, force=attempt > 0)
+                query, _ = enc_wbi(params, img_key, sub_key)
+                result = await self._get_json(f"{search_url}?{query}", headers, acc)
+                if result["code"] not in WBI_REJECT_CODES:
+                    break
+
+            if result["code"] != 0:
+                logger.error("请求失败: code=%s message=%s", result.get("code"), result.get("message"))
+                return "", False
+
+            vlist = (((result.get("data") or {}).get("list") or {}).get("vlist")) or []
+            closest_video = pick_closest_video(vlist, title_keyword, after_timestamp)
+            if closest_video:
+                return closest_video.get("bvid", ""), closest_video.get("is_self_view", False)
+            return "", False
+        except Exception:
+            logger.exception("请求发生错误")
+            return "", False
@@ -1,47 +1,210 @@
-"""配置文件处理模块"""
-import yaml
+"""配置文件处理模块
+
+配置文件修改后自动重新加载：:meth:`Config.watch` 启动的后台线程定期
+检查文件的修改时间，变化时解析并校验新配置，校验通过后整体替换，
+再通知订阅了发生变化的配置段的回调。配置有误时继续使用原配置。
+配置文件在第一次访问配置时才读取，导入本模块不会解析 YAML。
+"""
 import os
-from typing import Dict
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from account_store import AccountStore, account_key
+from logger import logger
+
+SECTIONS = ('bilibili', 'monitor', 'danmaku')
+
+
+def _check_number(errors: List[str], section: Dict, key: str, name: str, minimum: float = 0, required: bool = True):
+    if key not in section:
+        if required:
+            errors.append(f"缺少 {name}.{key}")
+        return
+    value = section[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum:
+        errors.append(f"{name}.{key} 必须是不小于 {minimum} 的数字")
+
+
+def validate_config(data) -> List[str]:
+    """校验配置内容，返回错误列表"""
+    if not isinstance(data, dict):
+        return ["配置文件内容不是字典"]
+    errors = [f"缺少配置段 {name}" for name in SECTIONS if not isinstance(data.get(name), dict)]
+    if errors:
+        return errors
+
+    bilibili, monitor, danmaku = data['bilibili'], data['monitor'], data['danmaku']
+    if not bilibili.get('user_agent'):
+        errors.append("缺少 bilibili.user_agent")
+    _check_number(errors, bilibili, 'batch_size', 'bilibili', 1)
+    for key in ('wbi_key_ttl', 'cookie_check_interval', 'cookie_check_gap'):
+        _check_number(errors, bilibili, key, 'bilibili', 0, required=False)
+    _check_number(errors, monitor, 'interval', 'monitor', 1)
+    _check_number(errors, monitor, 'retry_delay', 'monitor', 0)
+    for key in ('max_interval', 'publish_delay', 'publish_window', 'max_retries'):
+        _check_number(errors, monitor, key, 'monitor', 0, required=False)
+    _check_number(errors, monitor, 'max_concurrent_videos', 'monitor', 1, required=False)
+    _check_number(errors, monitor, 'metrics_port', 'monitor', 0, required=False)
+    _check_number(errors, danmaku, 'send_interval', 'danmaku', 0)
+    _check_number(errors, danmaku, 'max_count_per_hour', 'danmaku', 1)
+    _check_number(errors, danmaku, 'max_repeat_count', 'danmaku', 1)
+
+    ban_keywords = danmaku.get('ban_keywords') or []
+    if not isinstance(ban_keywords, list):
+        errors.append("danmaku.ban_keywords 必须是列表")
+    else:
+        from keyword_filter import KeywordMatcher
+        try:
+            KeywordMatcher(ban_keywords, danmaku.get('ban_keywords_ignore_case', False))
+        except Exception as e:
+            errors.append(f"danmaku.ban_keywords 无效: {e}")
+    return errors
+
 
 class Config:
     _instance = None
     _config = None
-    
+
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
             cls._instance = Config()
         return cls._instance
-    
+
     def __init__(self):
+        self._subscribers: Dict[str, List[Callable[[Dict], None]]] = {}
+        self._signature: Optional[tuple] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self) -> Dict:
         if self._config is None:
-            self.reload()
-            
+            with self._load_lock:
+                if self._config is None:
+                    self.reload()
+        return self._config
+
     def _get_project_root(self):
         """获取项目根目录"""
         return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    
+
+    def _config_path(self) -> str:
+        return os.path.join(self._get_project_root(), 'config', 'config.yaml')
+
+    def _stat(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self._config_path())
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
     def reload(self):
-        config_path = os.path.join(self._get_project_root(), 'config', 'config.yaml')
-        with open(config_path, 'r', encoding='utf-8') as f:
+        import yaml
+
+        self._signature = self._stat()
+        with open(self._config_path(), 'r', encoding='utf-8') as f:
             self._config = yaml.safe_load(f)
-    
+
+        # 账号单独保存在 config/accounts/ 下，旧版写在配置文件中的账号导入后移除
+        self.account_store = AccountStore(os.path.join(self._get_project_root(), 'config', 'accounts'))
+        accounts = self.account_store.load()
+        legacy = self._config['bilibili'].get('accounts') or []
+        if legacy:
+            existing = {account_key(acc) for acc in accounts}
+            legacy = [acc for acc in legacy if acc and account_key(acc) not in existing]
+            self._config['bilibili']['accounts'] = accounts + legacy
+            self.save_accounts()
+            self._config['bilibili']['accounts'] = []
+            self.save()
+            accounts = self.account_store.load()
+        self._config['bilibili']['accounts'] = accounts
+
+    def check_reload(self) -> bool:
+        """配置文件有变化时重新加载，返回是否应用了新配置"""
+        import yaml
+
+        self._ensure_loaded()
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+
+        try:
+            with open(self._config_path(), 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as e:
+            logger.error(f"读取配置文件失败，继续使用原配置: {e}")
+            return False
+        errors = validate_config(data)
+        if errors:
+            logger.error(f"配置文件有误，继续使用原配置: {'; '.join(errors)}")
+            return False
+
+        if data['bilibili'].get('accounts'):
+            logger.warning("运行中不会导入配置文件中的账号，请使用 login.sh 添加账号")
+        # 账号由 AccountStore 管理，沿用当前的账号列表
+        data['bilibili']['accounts'] = self._config['bilibili']['accounts']
+        old, self._config = self._config, data
+
+        changed = [name for name in SECTIONS if old.get(name) != data.get(name)]
+        logger.info(f"配置文件已重新加载，变化的配置段: {', '.join(changed) or '无'}")
+        for name in changed:
+            for callback in self._subscribers.get(name, []):
+                try:
+                    callback(data[name])
+                except Exception:
+                    logger.exception(f"应用 {name} 配置失败")
+        return True
+
+    def subscribe(self, section: str, callback: Callable[[Dict], None]):
+        """订阅配置段，该段重新加载后有变化时以新内容调用 ``callback``"""
+        self._subscribers.setdefault(section, []).append(callback)
+
+    def watch(self, interval: float = 2):
+        """启动后台线程，每 ``interval`` 秒检查一次配置文件是否被修改"""
+        if self._watcher is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.check_reload()
+                except Exception:
+                    logger.exception("检查配置文件失败")
+
+        self._watcher = threading.Thread(target=loop, name='config-watch', daemon=True)
+        self._watcher.start()
+
     def save(self):
-        config_path = os.path.join(self._get_project_root(), 'config', 'config.yaml')
-        with open(config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(self._config, f, allow_unicode=True, sort_keys=False)
-    
+        """保存配置文件，账号信息不写入配置文件"""
+        import yaml
+
+        self._ensure_loaded()
+        config_path = self._config_path()
+        data = dict(self._config, bilibili=dict(self._config['bilibili'], accounts=[]))
+        tmp_path = f"{config_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            yaml.dump(data, f, allow_unicode=True, sort_keys=False)
+        os.replace(tmp_path, config_path)
+        self._signature = self._stat()
+
+    def save_accounts(self):
+        """保存账号信息，只写入有变化的账号"""
+        self.account_store.sync(self._ensure_loaded()['bilibili']['accounts'])
+
     @property
     def bilibili(self) -> Dict:
-        return self._config['bilibili']
-    
+        return self._ensure_loaded()['bilibili']
+
     @property
     def monitor(self) -> Dict:
-        return self._config['monitor']
-    
+        return self._ensure_loaded()['monitor']
+
     @property
     def danmaku(self) -> Dict:
-        return self._config['danmaku']
+        return self._ensure_loaded()['danmaku']
 
 # 创建全局配置实例
-config = Config.get_instance() 
\ No newline at end of file
+config = Config.get_instance()
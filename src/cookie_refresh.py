@@ -1,17 +1,28 @@
 import time
-import requests
+import random
 import re
-from Crypto.Cipher import PKCS1_OAEP
-from Crypto.PublicKey import RSA
-from Crypto.Hash import SHA256
+import threading
+from typing import Dict, Optional
 import binascii
 from logger import logger
 from config import config
 from login import get_user_info
+from http_client import base_url, get_session
+from account_store import account_key
+
+# 从 correspond 页面中提取 refresh_csrf
+REFRESH_CSRF_PATTERN = re.compile(r'<div id="1-name">([^<]+)</div>')
+# 检查结果为无需刷新后，同一账号在该时间内不再重复检查(秒)
+REFRESH_CHECK_COOLDOWN = 60
+# 后台检查线程重新读取账号列表的间隔(秒)
+KEEPER_RESCAN_INTERVAL = 60
 
 
 class CookieRefresher:
     def __init__(self):
+        # pycryptodome 只在刷新Cookie时才需要，延迟到第一次创建时导入
+        from Crypto.PublicKey import RSA
+
         self.public_key = RSA.importKey('''\
 -----BEGIN PUBLIC KEY-----
 MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDLgd2OAkcGVtoE3ThUREbio0Eg
@@ -22,6 +33,9 @@ JNrRuoEUXpabUzGB8QIDAQAB
 
     def get_correspond_path(self, ts: int) -> str:
         """生成CorrespondPath"""
+        from Crypto.Cipher import PKCS1_OAEP
+        from Crypto.Hash import SHA256
+
         ts -= 20 * 1000
         cipher = PKCS1_OAEP.new(self.public_key, SHA256)
         encrypted = cipher.encrypt(f'refresh_{ts}'.encode())
@@ -29,14 +43,14 @@ JNrRuoEUXpabUzGB8QIDAQAB
 
     def check_need_refresh(self, account: dict) -> bool:
         """检查是否需要刷新Cookie"""
-        url = "https://passport.bilibili.com/x/passport-login/web/cookie/info"
+        url = f"{base_url('passport')}/x/passport-login/web/cookie/info"
         headers = {
             'Cookie': f"SESSDATA={account['sessdata']}; bili_jct={account['csrf']}",
             'User-Agent': config.bilibili['user_agent'],
         }
 
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session(account).get(url, headers=headers, timeout=10)
             data = response.json()
             if data['code'] != 0:
                 return True
@@ -49,13 +63,13 @@ JNrRuoEUXpabUzGB8QIDAQAB
         """获取refresh_csrf"""
         ts = round(time.time() * 1000)
         correspond_path = self.get_correspond_path(ts)
-        url = f"https://www.bilibili.com/correspond/1/{correspond_path}"
+        url = f"{base_url('www')}/correspond/1/{correspond_path}"
         headers = {'Cookie': f"SESSDATA={account['sessdata']}",
                    'User-Agent': config.bilibili['user_agent'], }
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session(account).get(url, headers=headers, timeout=10)
             # 使用正则表达式从HTML中提取refresh_csrf
-            match = re.search(r'<div id="1-name">([^<]+)</div>', response.text)
+            match = REFRESH_CSRF_PATTERN.search(response.text)
             if match:
                 return match.group(1)
         except Exception:
@@ -76,7 +90,7 @@ JNrRuoEUXpabUzGB8QIDAQAB
 
         logger.info(f"获取到refresh_csrf: {refresh_csrf}")
 
-        url = "https://passport.bilibili.com/x/passport-login/web/cookie/refresh"
+        url = f"{base_url('passport')}/x/passport-login/web/cookie/refresh"
         data = {
             'csrf': account['csrf'],
             'refresh_csrf': refresh_csrf,
@@ -87,7 +101,7 @@ JNrRuoEUXpabUzGB8QIDAQAB
                    'User-Agent': config.bilibili['user_agent'], }
 
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = get_session(account).post(url, data=data, headers=headers, timeout=10)
             result = response.json()
 
             if result['code'] == 0:
@@ -118,7 +132,7 @@ JNrRuoEUXpabUzGB8QIDAQAB
 
     def confirm_refresh(self, new_account: dict, old_refresh_token: str):
         """确认更新"""
-        url = "https://passport.bilibili.com/x/passport-login/web/confirm/refresh"
+        url = f"{base_url('passport')}/x/passport-login/web/confirm/refresh"
         data = {
             'csrf': new_account['csrf'],
             'refresh_token': old_refresh_token
@@ -127,25 +141,168 @@ JNrRuoEUXpabUzGB8QIDAQAB
                    'User-Agent': config.bilibili['user_agent']}
 
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = get_session(new_account).post(url, data=data, headers=headers, timeout=10)
             if response.json()['code'] == 0:
                 logger.info("Cookie更新确认成功")
         except Exception as e:
             logger.error(f"确认更新失败: {str(e)}")
 
 
-def refresh_all_cookies():
-    """刷新所有账号的Cookie"""
-    refresher = CookieRefresher()
-    new_accounts = []
+class _RefreshFlight:
+    """同一账号正在进行的一次刷新，并发的调用方等待并共享其结果"""
+    __slots__ = ('done', 'result')
 
-    for account in config.bilibili['accounts']:
-        logger.info(f"正在检查账号 {account['uname']} 的Cookie状态")
-        new_account = refresher.refresh_cookie(account)
-        new_accounts.append(new_account)
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = False
+
+
+_refresher: Optional[CookieRefresher] = None
+_flights: Dict[str, _RefreshFlight] = {}
+_checked_at: Dict[str, float] = {}
+_flights_lock = threading.Lock()
+# 各账号最近一次确认Cookie可用（检查无需刷新或刷新成功）的时间
+_fresh_at: Dict[str, float] = {}
+
+
+def _get_refresher() -> CookieRefresher:
+    global _refresher
+    if _refresher is None:
+        _refresher = CookieRefresher()
+    return _refresher
+
+
+def refresh_account(account: dict, stale_sessdata: Optional[str] = None) -> bool:
+    """刷新单个账号的Cookie，结果就地写回 ``account`` 并保存
+
+    同一账号的并发调用只会执行一次刷新，其余调用等待并共享结果。
+    ``stale_sessdata`` 为请求失败时使用的 SESSDATA，如果账号已经在此
+    之后被刷新过则直接返回。返回账号的Cookie是否已更新为可用的新值。
+    """
+    key = account_key(account)
+    with _flights_lock:
+        if stale_sessdata is not None and account['sessdata'] != stale_sessdata:
+            return not account.get('expired', False)
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            if time.monotonic() - _checked_at.get(key, float('-inf')) < REFRESH_CHECK_COOLDOWN:
+                return False
+            flight = _flights[key] = _RefreshFlight()
+
+    if not leader:
+        flight.done.wait()
+        return flight.result
+
+    try:
+        logger.info(f"正在检查账号 {account.get('uname')} 的Cookie状态")
+        old_sessdata = account['sessdata']
+        new_account = _get_refresher().refresh_cookie(account)
+        if new_account is not account:
+            account.update(new_account)  # 就地更新，账号池和配置中的同一账号随之生效
+        flight.result = account['sessdata'] != old_sessdata and not account.get('expired', False)
+        if new_account is account and not account.get('expired', False):
+            _checked_at[key] = time.monotonic()  # 无需刷新
+        else:
+            _checked_at.pop(key, None)
+        if not account.get('expired', False):
+            _fresh_at[key] = time.time()
+        config.save_accounts()
+    except Exception:
+        logger.exception(f"刷新账号 {account.get('uname')} 的Cookie报错")
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    return flight.result
 
-    config.bilibili['accounts'] = new_accounts
-    config.save()
-    logger.info("已更新配置文件中的Cookie信息")
 
-    return new_accounts
+def is_healthy(account: dict) -> bool:
+    """账号当前是否适合发送：未过期且没有正在刷新Cookie"""
+    if account.get('expired', False):
+        return False
+    with _flights_lock:
+        return account_key(account) not in _flights
+
+
+def account_freshness() -> Dict[str, dict]:
+    """各账号的Cookie状态，``fresh_at`` 为最近一次确认可用的时间"""
+    return {
+        account_key(acc): {
+            'uname': acc.get('uname'),
+            'expired': acc.get('expired', False),
+            'refreshing': not acc.get('expired', False) and not is_healthy(acc),
+            'fresh_at': _fresh_at.get(account_key(acc)),
+        }
+        for acc in config.bilibili['accounts'] if acc
+    }
+
+
+class CookieKeeper:
+    """后台定期检查各账号的Cookie并提前刷新
+
+    每个账号约每 ``interval`` 秒检查一次，检查时间随机错开，且任意两次
+    检查至少间隔 ``min_gap`` 秒，避免集中请求。``interval`` 不大于 0 时不检查，
+    运行中改为 0 后线程退出，之后可以再次 :meth:`start`。
+    """
+
+    def __init__(self, interval: float, min_gap: float):
+        self.interval = interval
+        self.min_gap = min_gap
+        self._next_check: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._thread is None or not self._thread.is_alive() or self._stop.is_set():
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name='cookie-keeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _next_due(self, now: float) -> tuple[float, Optional[dict]]:
+        accounts = {account_key(acc): acc for acc in config.bilibili['accounts']
+                    if acc and not acc.get('expired', False)}
+        for key in list(self._next_check):
+            if key not in accounts:
+                del self._next_check[key]
+        for key in accounts:
+            if key not in self._next_check:
+                # 新账号在一个周期内随机安排第一次检查
+                self._next_check[key] = now + random.uniform(0, self.interval)
+        if not self._next_check:
+            return now + self.interval, None
+        key = min(self._next_check, key=self._next_check.get)
+        return self._next_check[key], accounts[key]
+
+    def _run(self, stop: threading.Event):
+        last_check = float('-inf')
+        while not stop.is_set():
+            if self.interval <= 0:
+                break
+            now = time.time()
+            due, account = self._next_due(now)
+            wait = max(due - now, last_check + self.min_gap - now, 0)
+            if wait > 0:
+                # 账号列表可能变化，定期重新计算
+                stop.wait(min(wait, KEEPER_RESCAN_INTERVAL))
+                continue
+            if account is None:
+                continue
+            last_check = time.time()
+            self._next_check[account_key(account)] = last_check + self.interval * random.uniform(0.8, 1.2)
+            try:
+                refresh_account(account)
+            except Exception:
+                logger.exception("定期检查Cookie报错")
+
+
+def refresh_all_cookies():
+    """逐个刷新所有账号的Cookie"""
+    for account in config.bilibili['accounts']:
+        refresh_account(account)
+    return config.bilibili['accounts']
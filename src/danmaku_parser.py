@@ -0,0 +1,110 @@
+"""XML弹幕流式解析模块"""
+import xml.etree.ElementTree as ET
+from typing import Iterator, List, Mapping, Tuple
+
+from records import DanmakuRecords, DanmakuType
+
+# (时间戳, uid, 用户名, 内容, 礼物总价, 类型)
+RawDanmaku = Tuple[float, str, str, str, int, DanmakuType]
+
+
+def _to_int(value: str) -> int:
+    """解析整数属性，空字符串视为 0"""
+    return int(value) if value else 0
+
+
+def _parse_gift(elem: Mapping, base_timestamp: float | None) -> RawDanmaku | None:
+    """将礼物弹幕元素转换为原始弹幕字段
+
+    ``elem`` 可以是 ``Element`` 或其属性字典。普通礼物的内容为
+    ``礼物名 x数量``，点亮类礼物的内容只有礼物名。若 ``base_timestamp``
+    未确定则返回 ``None``。
+    """
+    since_start = elem.get('since_start')
+    if since_start is not None:
+        time_stamp = float(since_start)
+    elif base_timestamp is not None:
+        abs_time = float(elem.get('timestamp', '0'))
+        time_stamp = abs_time - base_timestamp
+    else:
+        return None
+    uname = elem.get('username', elem.get('user', ''))
+    uid = elem.get('uid', '')
+    giftname = elem.get('giftname', '')
+    price = elem.get('price', '0')
+    num = elem.get('num', '0')
+    total_price = _to_int(price) * _to_int(num)
+    if giftname.startswith("点亮"):
+        return time_stamp, uid, uname, giftname, total_price, DanmakuType.LIGHT
+    return time_stamp, uid, uname, f"{giftname} x{num}", total_price, DanmakuType.GIFT
+
+
+def _flush_gifts(pending_gifts: List[Mapping], base_timestamp: float) -> Iterator[RawDanmaku]:
+    """将缓存的礼物弹幕按基准时间转换后依次产出"""
+    for g in pending_gifts:
+        parsed = _parse_gift(g, base_timestamp)
+        if parsed is not None:
+            yield parsed
+    pending_gifts.clear()
+
+
+def iter_danmaku(xml_path: str) -> Iterator[RawDanmaku]:
+    """流式解析XML弹幕文件，逐条产出弹幕
+
+    使用 ``iterparse`` 边读边解析，处理完的元素立即从根节点清除，
+    内存占用与文件大小无关。``<d>`` 为普通弹幕，``<s type="gift">``
+    为礼物弹幕；在第一条普通弹幕确定基准时间前出现的礼物弹幕只缓存
+    其属性，待基准时间确定后再按原顺序产出。
+    """
+    base_timestamp = None  # 视频开始的 Unix 时间戳
+    pending_gifts: List[dict] = []
+    root = None
+    depth = 0
+
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        # 只处理根节点的直接子元素，嵌套元素随父元素一起释放
+        if depth != 1:
+            continue
+
+        if elem.tag == 'd':
+            # 普通弹幕
+            p_attr = elem.get('p')
+            rel_time = float(p_attr.split(',')[0]) if p_attr else 0.0
+            abs_time = float(elem.get('timestamp', '0'))
+
+            if base_timestamp is None:
+                base_timestamp = abs_time - rel_time
+                yield from _flush_gifts(pending_gifts, base_timestamp)
+
+            time_stamp = rel_time if p_attr else abs_time - base_timestamp
+            content = elem.text or ""
+            yield time_stamp, elem.get('uid', ''), elem.get('user', ''), content, 0, DanmakuType.DANMAKU
+
+        elif elem.tag == 's' and elem.get('type') == 'gift':
+            parsed = _parse_gift(elem, base_timestamp)
+            if parsed is None:
+                pending_gifts.append(dict(elem.attrib))
+            else:
+                yield parsed
+
+        root.clear()
+
+    # 若遍历结束后仍未确定基准时间，使用最早礼物弹幕时间作为基准
+    if pending_gifts:
+        if base_timestamp is None:
+            base_timestamp = float(pending_gifts[0].get('timestamp', '0'))
+        yield from _flush_gifts(pending_gifts, base_timestamp)
+
+
+def load_records(xml_path: str) -> DanmakuRecords:
+    """流式解析XML弹幕文件并存入列式容器"""
+    records = DanmakuRecords()
+    for item in iter_danmaku(xml_path):
+        records.append(*item)
+    return records
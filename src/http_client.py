@@ -0,0 +1,123 @@
+"""HTTP 连接池模块
+
+每个账号复用一个 ``requests.Session``，未登录请求共用一个匿名会话，
+避免每次请求都重新建立 TCP/TLS 连接。Cookie 通过请求头显式传入，
+会话自身不保存服务端下发的 Cookie，以免账号之间串号。
+
+接口域名可以通过 ``bilibili.api_base``、``passport_base``、``www_base``
+指向其他地址（例如本地的模拟服务），未配置时使用B站的正式域名。
+
+每个请求的接口、账号、耗时和返回码记录到 :data:`metrics.metrics`。
+"""
+import threading
+import time
+import urllib.parse
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+POOL_CONNECTIONS = 4  # 每个会话缓存的主机连接池数量
+POOL_MAXSIZE = 8  # 每个主机保持的最大连接数
+
+DEFAULT_BASES = {
+    'api': 'https://api.bilibili.com',
+    'passport': 'https://passport.bilibili.com',
+    'www': 'https://www.bilibili.com',
+}
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def endpoint_label(url: str) -> str:
+    """指标中使用的接口名，即URL的路径"""
+    path = urllib.parse.urlsplit(url).path
+    # correspond 页面的路径中带有每次不同的加密串
+    return '/correspond/1' if path.startswith('/correspond/1/') else path
+
+
+def _response_code(response: requests.Response) -> str:
+    """B站接口返回JSON中的 ``code``，其他响应使用 HTTP 状态码"""
+    if 'json' in response.headers.get('Content-Type', ''):
+        try:
+            return str(response.json().get('code'))
+        except ValueError:
+            pass
+    return str(response.status_code)
+
+
+class _MeteredAdapter(HTTPAdapter):
+    """记录每个请求的耗时和返回码，请求失败时返回码记为 ``error``"""
+
+    def __init__(self, account: str, **kwargs):
+        self.account = account
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        start = time.perf_counter()
+        code = 'error'
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+            if not stream:
+                response.content  # 读完响应体，耗时包含下载时间
+                code = _response_code(response)
+            else:
+                code = str(response.status_code)
+            return response
+        finally:
+            metrics.observe_request(endpoint_label(request.url), self.account, time.perf_counter() - start, code)
+
+
+def account_label(acc: Optional[dict]) -> str:
+    """指标中使用的账号名"""
+    if not acc:
+        return 'anonymous'
+    return str(acc.get('uname') or acc.get('mid') or 'anonymous')
+
+
+def _new_session(account: str) -> requests.Session:
+    session = requests.Session()
+    adapter = _MeteredAdapter(account, pool_connections=POOL_CONNECTIONS,
+                              pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def _account_key(acc: Optional[dict]) -> str:
+    if not acc:
+        return ''
+    return str(acc.get('mid') or acc.get('uname') or acc.get('csrf', ''))
+
+
+def get_session(acc: Optional[dict] = None) -> requests.Session:
+    """获取账号对应的会话，``acc`` 为空时返回匿名会话"""
+    key = _account_key(acc)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = _new_session(account_label(acc))
+    return session
+
+
+def close_all():
+    """关闭所有会话及其连接"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def base_url(name: str) -> str:
+    """``name`` 为 ``api``、``passport`` 或 ``www``，返回对应的接口地址"""
+    from config import config
+
+    return (config.bilibili.get(f'{name}_base') or DEFAULT_BASES[name]).rstrip('/')
@@ -0,0 +1,119 @@
+"""屏蔽关键词匹配模块"""
+import re
+from collections import deque
+from typing import Dict, Iterable, List
+
+
+class _Automaton:
+    """Aho-Corasick 自动机，只关心是否命中任意关键词"""
+    __slots__ = ('_goto', '_fail', '_out')
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[bool] = [False]
+        for word in keywords:
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(False)
+                state = nxt
+            self._out[state] = True
+
+        # 广度优先构建失配指针，并沿失配链传递命中标记
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] or self._out[self._fail[nxt]]
+
+    def __bool__(self) -> bool:
+        return len(self._goto) > 1 or self._out[0]
+
+    def search(self, text: str) -> bool:
+        if self._out[0]:
+            return True
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                return True
+        return False
+
+
+class KeywordMatcher:
+    """屏蔽关键词匹配器
+
+    ``keywords`` 中的每一项可以是：
+
+    - 字符串：按子串匹配
+    - ``{keyword: ..., ignore_case: true}``：按子串匹配，可选忽略大小写
+    - ``{regex: ..., ignore_case: true}``：按正则表达式搜索
+
+    所有字面关键词编译为 Aho-Corasick 自动机，正则合并为一个表达式，
+    每条弹幕只需扫描一遍。
+    """
+
+    def __init__(self, keywords: Iterable, ignore_case: bool = False):
+        exact: List[str] = []
+        folded: List[str] = []
+        patterns: List[str] = []
+        for entry in keywords or []:
+            if isinstance(entry, dict):
+                entry_ignore_case = entry.get('ignore_case', ignore_case)
+                if 'regex' in entry:
+                    flags = 'i' if entry_ignore_case else ''
+                    re.compile(entry['regex'])  # 提前暴露无效的正则
+                    patterns.append(f"(?{flags}:{entry['regex']})" if flags else f"(?:{entry['regex']})")
+                    continue
+                word = str(entry.get('keyword', ''))
+            else:
+                entry_ignore_case = ignore_case
+                word = str(entry)
+            if entry_ignore_case:
+                folded.append(word.casefold())
+            else:
+                exact.append(word)
+
+        self._exact = _Automaton(exact)
+        self._folded = _Automaton(folded)
+        self._regex = re.compile('|'.join(patterns)) if patterns else None
+
+    def search(self, text: str) -> bool:
+        """判断文本是否命中任意屏蔽关键词"""
+        if self._exact and self._exact.search(text):
+            return True
+        if self._folded and self._folded.search(text.casefold()):
+            return True
+        if self._regex is not None and self._regex.search(text):
+            return True
+        return False
+
+
+_matcher_cache: Dict[str, KeywordMatcher] = {}
+
+
+def get_ban_matcher(danmaku_config: Dict) -> KeywordMatcher:
+    """根据弹幕配置获取屏蔽关键词匹配器，配置不变时复用已构建的实例"""
+    keywords = danmaku_config.get('ban_keywords') or []
+    ignore_case = danmaku_config.get('ban_keywords_ignore_case', False)
+    key = repr((keywords, ignore_case))
+    matcher = _matcher_cache.get(key)
+    if matcher is None:
+        _matcher_cache.clear()
+        matcher = _matcher_cache[key] = KeywordMatcher(keywords, ignore_case)
+    return matcher
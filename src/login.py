@@ -1,20 +1,20 @@
 import requests
-import qrcode
 import time
 from config import config
 from logger import logger
+from http_client import base_url, get_session
 
 
 def get_user_info(sessdata: str) -> tuple[bool, dict]:
     """获取用户信息"""
-    url = "https://api.bilibili.com/x/web-interface/nav"
+    url = f"{base_url('api')}/x/web-interface/nav"
     headers = {
         'User-Agent': config.bilibili['user_agent'],
         'Cookie': f'SESSDATA={sessdata}'
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = get_session().get(url, headers=headers, timeout=10)
         data = response.json()
 
         if data['code'] != 0:
@@ -37,7 +37,7 @@ class BilibiliLogin:
 
     def generate_qrcode(self) -> tuple[str, str]:
         """生成登录二维码"""
-        url = "https://passport.bilibili.com/x/passport-login/web/qrcode/generate"
+        url = f"{base_url('passport')}/x/passport-login/web/qrcode/generate"
 
         try:
             headers = {'User-Agent': config.bilibili['user_agent']}
@@ -51,6 +51,8 @@ class BilibiliLogin:
             qrcode_key = data['data']['qrcode_key']
 
             # 在控制台打印二维码
+            import qrcode  # 只有扫码登录需要，避免其他入口加载 qrcode/PIL
+
             qr = qrcode.QRCode(border=1)
             qr.add_data(qr_url)
             qr.make(fit=True)
@@ -65,7 +67,7 @@ class BilibiliLogin:
 
     def poll_login_status(self, qrcode_key: str) -> tuple[int, dict]:
         """轮询登录状态"""
-        url = "https://passport.bilibili.com/x/passport-login/web/qrcode/poll"
+        url = f"{base_url('passport')}/x/passport-login/web/qrcode/poll"
         params = {'qrcode_key': qrcode_key}
 
         try:
@@ -172,8 +174,8 @@ def add_account():
             accounts.append(new_account)
             logger.info(f"添加新账号: {user_info['uname']}")
 
-        config.save()
-        logger.info("账号信息已存到配置文件")
+        config.save_accounts()
+        logger.info("账号信息已保存到 config/accounts/")
 
     except Exception as e:
         import traceback
@@ -0,0 +1,189 @@
+"""运行指标
+
+记录每个对外请求（接口、账号、耗时、返回码）、各处理阶段的耗时和发送
+进度，以 Prometheus 文本格式输出。监控配置了 ``monitor.metrics_port``
+时在 ``127.0.0.1`` 上提供 ``/metrics``，可以在长时间发送的过程中查看
+吞吐量、各账号 36703 的比例和发送请求的 p99 耗时。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from logger import logger
+
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STAGE_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 30, 120, 600, 1800, 3600, 14400)
+
+# 指标名 -> (类型, 说明, 直方图分桶)
+METRICS = {
+    'bilibili_request_seconds': ('histogram', '对外请求耗时(秒)', REQUEST_BUCKETS),
+    'bilibili_requests_total': ('counter', '对外请求数，code 为接口返回码或 HTTP 状态码', None),
+    'bilibili_stage_seconds': ('histogram', '处理阶段耗时(秒)', STAGE_BUCKETS),
+    'bilibili_send_done': ('gauge', '已发送完成（成功或不可重试的失败）的弹幕数', None),
+    'bilibili_send_total': ('gauge', '发送计划中的弹幕数', None),
+    'bilibili_account_expired': ('gauge', '账号Cookie是否已过期', None),
+    'bilibili_account_fresh_timestamp_seconds': ('gauge', '账号Cookie最近一次确认可用的时间', None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # 各分桶自身的计数，输出时再累加
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    parts = ['{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[Labels, object]] = {name: {} for name in METRICS}
+        self._collectors: List[Callable[[], None]] = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[name][key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(METRICS[name][2])
+            histogram.observe(value)
+
+    def observe_request(self, endpoint: str, account: str, seconds: float, code):
+        """记录一次对外请求"""
+        self.observe('bilibili_request_seconds', seconds, endpoint=endpoint, account=account)
+        self.inc('bilibili_requests_total', endpoint=endpoint, account=account, code=code)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """统计 ``with`` 块的耗时，记为 ``stage`` 阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('bilibili_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """输出前调用 ``collector``，用于更新只在被查看时才需要计算的指标"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("收集指标失败")
+
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in METRICS.items():
+                series = self._values[name]
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    if kind != 'histogram':
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                        continue
+                    bounds = [str(bound) for bound in value.buckets] + ['+Inf']
+                    counts = list(accumulate(value.counts)) + [value.count]
+                    for bound, count in zip(bounds, counts):
+                        le = _format_labels(labels, f'le="{bound}"')
+                        lines.append(f"{name}_bucket{le} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """在后台线程中提供 ``/metrics``"""
+
+    def __init__(self, port: int, host: str = '127.0.0.1', registry: Optional[Registry] = None):
+        self.port = port
+        self.host = host
+        self.registry = registry or metrics
+        self._server = None
+
+    def start(self) -> bool:
+        """开始监听，监听失败时返回 ``False``"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError:
+            logger.exception(f"监听指标端口失败: {self.host}:{self.port}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"运行指标: http://{self.host}:{self._server.server_address[1]}/metrics")
+        return True
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# 全局指标实例
+metrics = Registry()
@@ -1,89 +1,226 @@
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import json
+import threading
 import time
 from logger import logger, clear_log
 from config import config
 from login import get_user_info
-from storage import Storage
-from api import get_video_parts, auto_send_danmaku, check_up_latest_video, send_danmaku
+from storage import PendingStore
+from sender import AccountPool
+from keyword_filter import get_ban_matcher
+from cookie_refresh import CookieKeeper, account_freshness, is_healthy
+from scheduler import PollScheduler
+from notify import NotifyServer
+from metrics import MetricsServer, metrics
+from add_pending_record import add_to_store, parse_biliup_data
+from send_plan import plan_path
+from api import SendIncomplete, get_video_parts, auto_send_danmaku, prepare_send_plan, get_up_recent_videos, match_pending_videos, send_danmaku
 import os
 
+PLAN_SETTLE_SECONDS = 60  # XML 超过该时间未修改才视为写入完成
+
 class VideoMonitor:
-    def __init__(self, config: Dict):
-        self.config = config
+    def __init__(self, monitor_config: Dict):
+        self.config = monitor_config
         # 使用项目根目录下的config路径
         config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config")
         os.makedirs(config_dir, exist_ok=True)
-        
-        self.storage = Storage(os.path.join(config_dir, 'pending_records.json'))
-        
-    def check_pending_videos(self):
+
+        self.storage = PendingStore(
+            os.path.join(config_dir, 'pending.db'),
+            legacy_json_path=os.path.join(config_dir, 'pending_records.json')
+        )
+
+        # 已发布的视频作为独立任务并发处理，所有任务共用一个账号池
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config.get('max_concurrent_videos', 2),
+            thread_name_prefix='video'
+        )
+        self.pool = AccountPool(config.bilibili['accounts'], send_interval=config.danmaku['send_interval'],
+                                health=is_healthy)
+        # 后台提前刷新即将失效的Cookie，发送时不再被动发现
+        self.cookie_keeper = CookieKeeper(
+            interval=config.bilibili.get('cookie_check_interval', 21600),
+            min_gap=config.bilibili.get('cookie_check_gap', 10)
+        )
+        self.scheduler = PollScheduler(os.path.join(config_dir, 'publish_latency.json'), self.config)
+        self._wakeup = threading.Event()
+        self._active: set = set()  # 正在处理的记录
+        self._active_bvids: set = set()  # 正在发送的视频
+        self._active_lock = threading.Lock()
+        self.notifier = NotifyServer(self._handle_command)
+        # 配置了端口时提供 Prometheus 格式的运行指标，修改端口需重启
+        self.metrics_server = MetricsServer(self.config.get('metrics_port', 0))
+        metrics.add_collector(self._collect_account_metrics)
+
+        # 视频发布前在后台预先生成发送计划，发布后直接开始发送
+        self.danmaku_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'danmaku')
+        self.plan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plan')
+        self._planning: set = set()  # 已提交生成计划的XML
+
+        # 配置文件修改后，只重建变化的配置段对应的状态
+        config.subscribe('monitor', self._on_monitor_config)
+        config.subscribe('danmaku', self._on_danmaku_config)
+        config.subscribe('bilibili', self._on_bilibili_config)
+
+    @staticmethod
+    def _collect_account_metrics():
+        for key, state in account_freshness().items():
+            metrics.set('bilibili_account_expired', int(state['expired']), account=state['uname'] or key)
+            if state['fresh_at'] is not None:
+                metrics.set('bilibili_account_fresh_timestamp_seconds', state['fresh_at'],
+                            account=state['uname'] or key)
+
+    @staticmethod
+    def _record_key(video: Dict) -> tuple:
+        return video['title_keyword'], video['after_timestamp']
+
+    def check_pending_videos(self) -> float | None:
+        """轮询到期的待处理记录，返回距离下一次轮询的秒数，没有记录时返回 ``None``"""
         # 读取当前的待处理列表
         pending_list = self.storage.load()
+        with self._active_lock:
+            pending_list = [v for v in pending_list if self._record_key(v) not in self._active]
         if not pending_list:
+            return None
+
+        now = time.time()
+        if not any(self.scheduler.is_due(v, now) for v in pending_list):
+            return self.scheduler.seconds_until_next(pending_list, now)
+
+        # 每轮只拉取一次UP主的投稿列表，所有记录在本地匹配
+        videos = get_up_recent_videos(
+            mid=self.config['mid'],
+            after_timestamp=min(v['after_timestamp'] for v in pending_list)
+        )
+        if videos is None:
+            return self.config['retry_delay']
+
+        # 同一场直播可能有多条记录匹配到同一个视频，每个视频只提交一个任务
+        jobs: Dict[str, tuple] = {}
+        for video, info in match_pending_videos(videos, pending_list):
+            jobs.setdefault(info['bvid'], (info, []))[1].append(video)
+
+        published = set()
+        for bvid, (info, records) in jobs.items():
+            with self._active_lock:
+                if bvid in self._active_bvids:
+                    continue  # 该视频正在发送，任务结束后再处理这些记录
+                self._active_bvids.add(bvid)
+                self._active.update(self._record_key(v) for v in records)
+            for video in records:
+                logger.info(f"视频已发布: {video['title_keyword']} - {bvid}")
+                published.add(self._record_key(video))
+            self.executor.submit(self._run_video_job, records, info)
+
+        remaining = [v for v in pending_list if self._record_key(v) not in published]
+        for video in remaining:
+            self.scheduler.schedule(video, now)
+        return self.scheduler.seconds_until_next(remaining, now)
+
+    def _run_video_job(self, records: List[Dict], info: Dict):
+        """处理单个已发布视频：发送各分P弹幕，完成后从待处理列表移除匹配到该视频的全部记录
+
+        处理失败的记录保留，按连续失败次数退避后再重新匹配。
+        """
+        bvid = info['bvid']
+        title = records[0]['title_keyword']
+        try:
+            self.process_video(bvid, info['is_self_view'])
+            for video in records:
+                self.storage.remove(video['title_keyword'], video['after_timestamp'])
+            self.scheduler.record_published(records, info['created'])
+            logger.info(f"视频 {title} 处理完成")
+        except SendIncomplete as e:
+            # XML、发送计划和进度都保留；账号可能要等重新登录后才可用，退避后再继续发送
+            delay = self._back_off(records)
+            logger.error(f"视频 {title} 未发送完成，保留记录 {delay:.0f} 秒后重试: {e}")
+        except Exception as e:
+            delay = self._back_off(records)
+            logger.error(f"处理视频失败，{delay:.0f} 秒后重试: {str(e)}", exc_info=True)
+        finally:
+            with self._active_lock:
+                self._active.difference_update(self._record_key(v) for v in records)
+                self._active_bvids.discard(bvid)
+            # 记录处理中时主循环可能在无限期等待，任务结束后重新检查（失败的记录已按退避时间重新调度）
+            self.wake()
+
+    def _back_off(self, records: List[Dict]) -> float:
+        now = time.time()
+        return max(self.scheduler.record_failed(video, now) for video in records)
+
+    def process_video(self, bvid: str, is_self_view: bool):
+        # 获取视频分P信息并发送弹幕
+        parts = get_video_parts(self.config['mid'], bvid)
+        danmaku_dir = self.danmaku_dir
+
+        def send_part(cid: int, part: str, duration: int) -> int | None:
+            xml_file = os.path.join(danmaku_dir, f"{part}.xml")
+            if not os.path.exists(xml_file):
+                logger.warning(f"XML文件不存在: {xml_file}")
+                return None
+
+            earnings = auto_send_danmaku(
+                xml_path=xml_file,
+                video_cid=cid,
+                video_duration=duration,
+                bvid=bvid,
+                is_self_view=is_self_view,
+                pool=self.pool,
+                store=self.storage
+            )
+            # 全部弹幕都已有结果才会返回（否则抛出 SendIncomplete），删除XML文件、发送计划和发送进度
+            os.remove(xml_file)
+            if os.path.exists(plan_path(xml_file)):
+                os.remove(plan_path(xml_file))
+            self.storage.clear_progress(bvid, cid)
+            logger.info(f"已删除XML文件: {xml_file}")
+            return earnings
+
+        if self.config.get('parallel_parts', False) and len(parts) > 1:
+            with ThreadPoolExecutor(max_workers=len(parts), thread_name_prefix=f'{bvid}-part') as part_executor:
+                results = list(part_executor.map(lambda p: send_part(*p), parts))
+        else:
+            results = [send_part(*p) for p in parts]
+
+        total_earnings = sum(r for r in results if r is not None)
+        if parts and results[-1] is not None:
+            cid = parts[-1][0]
+            acc = config.bilibili['accounts'][0]
+            success, message, _ = send_danmaku(cid, f'Earned {total_earnings}', bvid, 0, 16646914, acc)
+            if not success:
+                logger.warning(f"发送主播收益失败, 消息: {message}")
+
+    def precompute_plans(self):
+        """为已写完的XML文件在后台生成发送计划"""
+        if not config.danmaku.get('precompute_plans', True) or not os.path.isdir(self.danmaku_dir):
             return
-            
-        processed_videos = []  # 记录已处理的视频
-            
-        for video in pending_list[:]:  # 使用切片创建副本以便修改
+        now = time.time()
+        for name in os.listdir(self.danmaku_dir):
+            xml_file = os.path.join(self.danmaku_dir, name)
+            if not name.endswith('.xml') or xml_file in self._planning:
+                continue
             try:
-                # 检查视频是否已发布
-                bvid, is_self_view = check_up_latest_video(
-                    mid=self.config['mid'],
-                    title_keyword=video['title_keyword'],
-                    after_timestamp=video['after_timestamp']
-                )
-                
-                if not bvid:
+                # 录制中的XML仍在写入，等文件一段时间不再变化后再处理
+                if now - os.path.getmtime(xml_file) < PLAN_SETTLE_SECONDS:
                     continue
-                    
-                logger.info(f"视频已发布: {video['title_keyword']} - {bvid}")
-                # 获取视频分P信息并发送弹幕
-                parts = get_video_parts(self.config['mid'], bvid)
-
-                total_earnings = 0
-                for index, (cid, part, duration) in enumerate(parts):
-                    xml_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'danmaku', f"{part}.xml")
-                    if not os.path.exists(xml_file):
-                        logger.warning(f"XML文件不存在: {xml_file}")
-                        continue
-
-                    total_earnings += auto_send_danmaku(
-                        xml_path=xml_file,
-                        video_cid=cid,
-                        video_duration=duration,
-                        bvid=bvid,
-                        is_self_view=is_self_view
-                    )
-                    # 发送完成后删除XML文件
-                    os.remove(xml_file)
-                    logger.info(f"已删除XML文件: {xml_file}")    
-                    if index == len(parts)-1:
-                        acc = config.bilibili['accounts'][0]
-                        success, message, _ = send_danmaku(cid, f'Earned {total_earnings}', bvid, 0, 16646914, acc)
-                        if not success:
-                            logger.warning(f"发送主播收益失败, 消息: {message}")
-
-
-                # 记录已处理的视频
-                processed_videos.append(video)
-                logger.info(f"视频 {video['title_keyword']} 处理完成")
-                
-            except Exception as e:
-                logger.error(f"处理视频失败: {str(e)}", exc_info=True)
-        
-        if processed_videos:
-            # 重新读取最新的待处理列表
-            current_pending_list = self.storage.load()
-            # 从最新列表中移除已处理的视频
-            for video in processed_videos:
-                for pending_video in current_pending_list[:]:
-                    if (pending_video['title_keyword'] == video['title_keyword'] and 
-                        pending_video['after_timestamp'] == video['after_timestamp']):
-                        current_pending_list.remove(pending_video)
-            
-            # 保存更新后的列表
-            self.storage.save(current_pending_list)
-    
+            except FileNotFoundError:
+                continue
+            self._planning.add(xml_file)
+            self.plan_executor.submit(self._prepare_plan, xml_file)
+
+    def _prepare_plan(self, xml_file: str):
+        try:
+            if prepare_send_plan(xml_file, self.storage.has_progress):
+                logger.info(f"已预先生成发送计划: {xml_file}")
+        except FileNotFoundError:
+            pass  # XML已被处理并删除
+        except Exception:
+            logger.exception(f"生成发送计划失败: {xml_file}")
+        finally:
+            self._planning.discard(xml_file)
+
     @staticmethod
     def check_accounts():
         for acc in config.bilibili['accounts']:
@@ -95,20 +232,88 @@ class VideoMonitor:
                     acc['uname'] = user_info['uname']
                     acc['level'] = user_info['level']
                     logger.info(f"更新账号信息: {acc['uname']}")
-        config.save()
-            
-    
+        # 只有账号信息变化时才会写入
+        config.save_accounts()
+
+
+    def _on_monitor_config(self, monitor_config: Dict):
+        self.config = monitor_config
+        self.scheduler.configure(monitor_config)
+        self.wake()
+
+    def _on_bilibili_config(self, bilibili_config: Dict):
+        self.cookie_keeper.interval = bilibili_config.get('cookie_check_interval', 21600)
+        self.cookie_keeper.min_gap = bilibili_config.get('cookie_check_gap', 10)
+        if self.cookie_keeper.interval > 0:
+            self.cookie_keeper.start()
+        else:
+            self.cookie_keeper.stop()
+
+    def _on_danmaku_config(self, danmaku_config: Dict):
+        if danmaku_config['send_interval'] != self.pool.send_interval:
+            self.pool.set_send_interval(danmaku_config['send_interval'])
+            logger.info(f"发送间隔已修改为 {danmaku_config['send_interval']} 秒")
+        # 预先构建新的屏蔽关键词匹配器；尚未开始发送的分P会按新的过滤配置重新生成发送计划，
+        # 已开始发送的分P沿用原来的计划，以免已发送的弹幕下标错位
+        get_ban_matcher(danmaku_config)
+        logger.info("弹幕配置已重新加载，过滤配置的变化从下一个开始发送的分P生效")
+
+    def wake(self):
+        """立即开始下一轮检查"""
+        self._wakeup.set()
+
+    def _handle_command(self, command: str) -> str:
+        if command == 'wake':
+            self.wake()
+            return 'ok'
+        if command.startswith('add '):
+            return self._add_record(command[4:])
+        if command == 'accounts':
+            return json.dumps(account_freshness(), ensure_ascii=False)
+        return f'unknown command: {command}'
+
+    def _add_record(self, payload: str) -> str:
+        """处理 submit_record 提交的 biliup 记录"""
+        try:
+            room_title, after_timestamp = parse_biliup_data(json.loads(payload))
+        except (ValueError, AttributeError) as e:
+            return f"error: 无效的记录: {e}"
+        if not room_title:
+            logger.error("房间标题为空，无法添加待处理记录")
+            return "error: 房间标题为空"
+        if not add_to_store(self.storage, room_title, after_timestamp):
+            return "exists"
+        self.wake()
+        return "ok"
+
     def monitor(self):
         logger.info("开始监控")
+        config.watch()
+        self.cookie_keeper.start()
+        notified = self.notifier.start()
+        if not notified:
+            logger.warning("通知套接字不可用，按轮询间隔检查新记录")
+        if self.metrics_server.port:
+            self.metrics_server.start()
         while True:
             try:
                 clear_log(logger)
                 self.check_accounts()
-                self.check_pending_videos()
-                time.sleep(self.config['interval'])
+                self.precompute_plans()
+                timeout = self.check_pending_videos()
+                # 新记录由 add_pending_record 通知唤醒；通知不可用时按基础间隔检查
+                if not notified and (timeout is None or timeout > self.config['interval']):
+                    timeout = self.config['interval']
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
             except KeyboardInterrupt:
                 logger.info("监控已停止")
+                self.notifier.close()
+                self.metrics_server.close()
+                self.cookie_keeper.stop()
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.plan_executor.shutdown(wait=False, cancel_futures=True)
                 break
             except Exception as e:
                 logger.error(f"监控发生错误: {str(e)}")
-                time.sleep(self.config['retry_delay']) 
+                time.sleep(self.config['retry_delay'])
@@ -0,0 +1,92 @@
+"""进程间通知模块
+
+监控进程在 ``config/monitor.sock`` 上监听 Unix 套接字，其他进程（如
+``add_pending_record``）写入待处理记录后发送一行命令唤醒监控立即检查，
+不必等到下一次轮询。每个连接发送一行命令，收到一行回复。
+"""
+import os
+import socket
+import threading
+from typing import Callable, Optional
+
+from logger import logger
+
+SOCKET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'monitor.sock')
+MAX_LINE = 64 * 1024
+
+
+def _read_line(conn: socket.socket) -> str:
+    buf = b''
+    while b'\n' not in buf and len(buf) < MAX_LINE:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        buf += chunk
+    return buf.split(b'\n', 1)[0].decode('utf-8')
+
+
+class NotifyServer:
+    """在后台线程中接收通知，每行命令交给 ``handler`` 处理，返回值作为回复"""
+
+    def __init__(self, handler: Callable[[str], str], path: str = SOCKET_PATH):
+        self.handler = handler
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """开始监听，当前平台不支持或监听失败时返回 ``False``"""
+        if not hasattr(socket, 'AF_UNIX'):
+            return False
+        try:
+            # 清理上次异常退出遗留的套接字文件
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            sock.listen(16)
+        except OSError:
+            logger.exception(f"监听通知套接字失败: {self.path}")
+            return False
+        self._sock = sock
+        self._thread = threading.Thread(target=self._serve, name='notify', daemon=True)
+        self._thread.start()
+        return True
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return  # 套接字已关闭
+            with conn:
+                try:
+                    conn.settimeout(5)
+                    reply = self.handler(_read_line(conn).strip())
+                    conn.sendall(f"{reply}\n".encode('utf-8'))
+                except Exception:
+                    logger.exception("处理通知失败")
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def send_command(command: str, path: str = SOCKET_PATH, timeout: float = 5) -> Optional[str]:
+    """向监控进程发送一行命令并返回回复，监控未运行时返回 ``None``"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(f"{command}\n".encode('utf-8'))
+            return _read_line(sock)
+    except OSError:
+        return None
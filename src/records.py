@@ -0,0 +1,95 @@
+"""弹幕记录的紧凑列式存储"""
+from array import array
+from enum import IntEnum
+from typing import Dict, List
+
+
+class DanmakuType(IntEnum):
+    """弹幕类型"""
+    DANMAKU = 0  # 普通弹幕 <d>
+    GIFT = 1  # 礼物弹幕，内容为 ``礼物名 x数量``
+    LIGHT = 2  # 点亮类礼物，内容仅为礼物名
+
+
+class StringPool:
+    """字符串驻留池，相同字符串只保存一份并以整数 id 引用"""
+    __slots__ = ('_ids', '_strings')
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+
+    def intern(self, s: str) -> int:
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self._strings)
+            self._ids[s] = sid
+            self._strings.append(s)
+        return sid
+
+    def __getitem__(self, sid: int) -> str:
+        return self._strings[sid]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class DanmakuRecords:
+    """按列存储的弹幕集合
+
+    每条弹幕拆分为时间戳、uid id、用户名 id、内容 id、礼物总价和类型六列，
+    uid、用户名与内容通过 :class:`StringPool` 去重，uid 保留XML中的原始字符串。过滤等操作只传递下标，
+    展示用的消息文本在发送时由 :meth:`message` 按需生成。
+    """
+    __slots__ = ('timestamps', 'uids', 'unames', 'contents', 'prices', 'types', 'uid_pool', 'uname_pool',
+                 'content_pool')
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.uids = array('L')
+        self.unames = array('L')
+        self.contents = array('L')
+        self.prices = array('q')
+        self.types = array('B')
+        self.uid_pool = StringPool()
+        self.uname_pool = StringPool()
+        self.content_pool = StringPool()
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, time_stamp: float, uid: str, uname: str, content: str, price: int, typ: DanmakuType):
+        self.timestamps.append(time_stamp)
+        self.uids.append(self.uid_pool.intern(uid))
+        self.unames.append(self.uname_pool.intern(uname))
+        self.contents.append(self.content_pool.intern(content))
+        self.prices.append(price)
+        self.types.append(typ)
+
+    def content(self, i: int) -> str:
+        return self.content_pool[self.contents[i]]
+
+    def is_gift(self, i: int) -> bool:
+        return self.types[i] != DanmakuType.DANMAKU
+
+    def message(self, i: int) -> str:
+        """生成第 ``i`` 条弹幕的发送文本
+
+        普通弹幕为 ``[用户名]([用户id])：[内容]``（缺少用户信息时只有内容），
+        礼物弹幕为 ``[用户名]([用户id]) donate [礼物名称] x[礼物数量]``，
+        点亮类礼物为 ``[用户名]([用户id]) [礼物名称]``。
+        """
+        content = self.content_pool[self.contents[i]]
+        uname = self.uname_pool[self.unames[i]]
+        uid = self.uid_pool[self.uids[i]]
+        typ = self.types[i]
+        if typ == DanmakuType.GIFT:
+            return f"{uname}({uid}) donate {content}"
+        if typ == DanmakuType.LIGHT:
+            return f"{uname}({uid}) {content}"
+        if uname == '' or uid == '':
+            return content
+        return f"{uname}({uid})：{content}"
+
+    def total_price(self) -> int:
+        return sum(self.prices)
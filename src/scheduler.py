@@ -0,0 +1,132 @@
+"""自适应轮询调度模块
+
+根据录播结束时间和历史上观察到的发布延迟（录播结束到视频发布的时间）
+预测每条待处理记录的发布时间：预测窗口内按基础间隔密集轮询，窗口之前
+低频轮询，超过窗口仍未发布的记录按指数退避逐渐降低频率。已发布但处理
+失败的记录从 ``retry_delay`` 开始按次数翻倍延后重试。
+"""
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from logger import logger
+
+MAX_HISTORY = 50  # 保留的发布延迟样本数
+MIN_SAMPLES = 5  # 样本数少于此值时使用默认预测
+MAX_LATENCY = 7 * 24 * 3600  # 超过此值的延迟视为异常样本
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class PollScheduler:
+    """为每条待处理记录计算下一次轮询时间"""
+
+    def __init__(self, history_path: str, monitor_config: Dict):
+        self.history_path = history_path
+        self.configure(monitor_config)
+        self.latencies: deque = deque(self._load_history(), maxlen=MAX_HISTORY)
+        self._next_due: Dict[tuple, float] = {}
+        self._failures: Dict[tuple, int] = {}  # 记录连续处理失败的次数
+
+    def configure(self, monitor_config: Dict):
+        """应用监控配置，已排定的下一次轮询时间不变"""
+        self.base_interval = monitor_config['interval']
+        self.max_interval = monitor_config.get('max_interval', 1800)
+        self.default_delay = monitor_config.get('publish_delay', 3600)
+        self.default_window = monitor_config.get('publish_window', 1800)
+        self.retry_delay = monitor_config.get('retry_delay', 5)
+
+    def _load_history(self) -> List[float]:
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                return [float(x) for x in json.load(f)][-MAX_HISTORY:]
+        except FileNotFoundError:
+            return []
+        except (ValueError, TypeError):
+            logger.warning(f"发布延迟记录格式错误，已忽略: {self.history_path}")
+            return []
+
+    def _save_history(self):
+        tmp_path = f"{self.history_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.latencies), f)
+        os.replace(tmp_path, self.history_path)
+
+    @staticmethod
+    def _key(record: Dict) -> tuple:
+        return record['title_keyword'], record['after_timestamp']
+
+    def publish_window(self) -> tuple[float, float]:
+        """预测的发布延迟区间（相对录播结束时间，秒）"""
+        if len(self.latencies) >= MIN_SAMPLES:
+            values = sorted(self.latencies)
+            margin = self.default_window / 2
+            return max(_percentile(values, 0.1) - margin, 0), _percentile(values, 0.9) + margin
+        return max(self.default_delay - self.default_window, 0), self.default_delay + self.default_window
+
+    def poll_interval(self, record: Dict, now: float) -> float:
+        """记录当前所处阶段对应的轮询间隔"""
+        lo, hi = self.publish_window()
+        start = record['after_timestamp'] + lo
+        end = record['after_timestamp'] + hi
+        if now < start:
+            # 还没到预测发布时间，低频轮询以防提前发布
+            return min(start - now, self.max_interval)
+        if now <= end:
+            return self.base_interval
+        # 超过预测窗口，每过一个窗口长度轮询间隔翻倍
+        step = max(hi - lo, self.base_interval)
+        interval = self.base_interval * 2 ** ((now - end) // step)
+        return min(interval, self.max_interval)
+
+    def is_due(self, record: Dict, now: float) -> bool:
+        """新出现的记录立即轮询一次"""
+        return self._next_due.get(self._key(record), now) <= now
+
+    def schedule(self, record: Dict, now: float):
+        self._next_due[self._key(record)] = now + self.poll_interval(record, now)
+
+    def forget(self, record: Dict):
+        self._next_due.pop(self._key(record), None)
+        self._failures.pop(self._key(record), None)
+
+    def record_failed(self, record: Dict, now: float) -> float:
+        """记录处理失败，按连续失败次数退避后再轮询，返回延后的秒数"""
+        key = self._key(record)
+        failures = self._failures.get(key, 0) + 1
+        self._failures[key] = failures
+        delay = min(self.retry_delay * 2 ** (failures - 1), self.max_interval)
+        self._next_due[key] = now + delay
+        return delay
+
+    def seconds_until_next(self, pending_list: List[Dict], now: Optional[float] = None) -> Optional[float]:
+        """距离下一次需要轮询的秒数，没有待处理记录时返回 ``None``"""
+        if not pending_list:
+            return None
+        now = time.time() if now is None else now
+        return max(min(self._next_due.get(self._key(r), now) for r in pending_list) - now, 0.0)
+
+    def record_published(self, records: List[Dict], publish_time: float):
+        """视频处理完成后记录一次发布延迟，用于改进预测
+
+        ``records`` 为匹配到同一视频的全部记录，只记录一个样本，以最晚结束的录播为准。
+        """
+        for record in records:
+            self.forget(record)
+        latency = publish_time - max(record['after_timestamp'] for record in records)
+        if not 0 < latency < MAX_LATENCY:
+            return
+        self.latencies.append(latency)
+        try:
+            self._save_history()
+        except OSError:
+            logger.exception("保存发布延迟记录失败")
+        lo, hi = self.publish_window()
+        logger.info(f"发布延迟 {latency / 60:.1f} 分钟，预测区间更新为 {lo / 60:.1f}~{hi / 60:.1f} 分钟")
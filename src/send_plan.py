@@ -0,0 +1,190 @@
+"""弹幕发送计划
+
+发送计划是解析、过滤、清洗之后按发送顺序排列的弹幕列表：时间戳、颜色、
+最终发送的消息文本以及本场收益。计划以紧凑的二进制格式保存在 XML 旁边（``{part}.plan``），
+进程重启后可以直接加载，不必重新解析和过滤 XML；配合 :class:`SendProgress`
+记录的发送进度，可以从中断处继续发送。
+
+文件格式（小端）::
+
+    magic b'BDPL' | version u16 | count u32 | earnings i64 | source_len u16 | source
+    timestamps f64[count] | colors u32[count] | offsets u32[count + 1] | messages utf-8
+"""
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Callable, Iterable, List, Optional
+
+MAGIC = b'BDPL'
+VERSION = 2
+_HEADER = struct.Struct('<4sHIqH')
+_SWAP = sys.byteorder != 'little'  # 文件中的数组统一为小端
+
+
+def plan_path(xml_path: str) -> str:
+    """XML 文件对应的发送计划路径"""
+    return os.path.splitext(xml_path)[0] + '.plan'
+
+
+def file_fingerprint(path: str) -> str:
+    """文件大小和修改时间，用于判断计划是否由当前文件生成"""
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _array(typecode: str, data: bytes = b'') -> array:
+    arr = array(typecode)
+    arr.frombytes(data)
+    if _SWAP:
+        arr.byteswap()
+    return arr
+
+
+class SendPlan:
+    """按发送顺序排列的弹幕，消息文本在访问时才解码"""
+    __slots__ = ('timestamps', 'colors', 'earnings', 'source', '_offsets', '_blob')
+
+    def __init__(self, timestamps: array, colors: array, offsets: array, blob: bytes, earnings: int, source: str):
+        self.timestamps = timestamps
+        self.colors = colors
+        self.earnings = earnings
+        self.source = source
+        self._offsets = offsets
+        self._blob = blob
+
+    @classmethod
+    def build(cls, timestamps: List[float], colors: List[int], messages: List[str], earnings: int, source: str) -> 'SendPlan':
+        offsets = array('I', [0])
+        encoded = []
+        size = 0
+        for message in messages:
+            data = message.encode('utf-8')
+            encoded.append(data)
+            size += len(data)
+            offsets.append(size)
+        return cls(array('d', timestamps), array('I', colors), offsets, b''.join(encoded), earnings, source)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def message(self, i: int) -> str:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def save(self, path: str):
+        source = self.source.encode('utf-8')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self), self.earnings, len(source)))
+            f.write(source)
+            for arr in (self.timestamps, self.colors, self._offsets):
+                if _SWAP:
+                    arr = array(arr.typecode, arr)
+                    arr.byteswap()
+                f.write(arr.tobytes())
+            f.write(self._blob)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_source(path: str) -> Optional[str]:
+        """只读取文件头中的来源标识，用于判断计划是否需要重新生成"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return None
+                magic, version, _, _, source_len = _HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION:
+                    return None
+                return f.read(source_len).decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, path: str) -> Optional['SendPlan']:
+        """读取发送计划，文件不存在或格式不符时返回 ``None``"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, count, earnings, source_len = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            return None
+        pos = _HEADER.size
+        source = data[pos:pos + source_len].decode('utf-8')
+        pos += source_len
+        timestamps = _array('d', data[pos:pos + 8 * count])
+        pos += 8 * count
+        colors = _array('I', data[pos:pos + 4 * count])
+        pos += 4 * count
+        offsets = _array('I', data[pos:pos + 4 * (count + 1)])
+        pos += 4 * (count + 1)
+        blob = data[pos:]
+        if len(timestamps) != count or len(offsets) != count + 1 or len(blob) != offsets[-1]:
+            return None
+        return cls(timestamps, colors, offsets, blob, earnings, source)
+
+
+class SendProgress:
+    """发送计划的完成进度
+
+    ``watermark`` 之前的弹幕都已有结果，``ahead`` 为 ``watermark`` 之后已有
+    结果的下标（并发发送时完成顺序不固定）。发送成功和不可重试的失败（如
+    内容被屏蔽）不再发送；多次重试仍被限速、账号失效或网络错误的弹幕同样
+    推进 ``watermark``，但另外记录在 ``retry`` 中，下次发送时重新尝试。这样
+    个别失败的弹幕不会让 ``ahead`` 越积越多。有结果的弹幕每累计
+    ``save_every`` 条或每隔 ``save_interval`` 秒调用一次 ``save``。
+    """
+
+    def __init__(self, total: int, watermark: int = 0, ahead: Iterable[int] = (), retry: Iterable[int] = (),
+                 save: Optional[Callable[[int, List[int], List[int]], None]] = None,
+                 save_every: int = 50, save_interval: float = 5):
+        self.total = total
+        self.watermark = min(watermark, total)
+        self.ahead = {i for i in ahead if self.watermark <= i < total}
+        self.retry = {i for i in retry if 0 <= i < total}
+        self._save = save
+        self._save_every = save_every
+        self._save_interval = save_interval
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    def remaining(self) -> List[int]:
+        """尚未发送成功、需要（重新）发送的下标"""
+        pending = [i for i in range(self.watermark, self.total) if i not in self.ahead]
+        return sorted(self.retry.union(pending))
+
+    @property
+    def done_count(self) -> int:
+        return self.watermark + len(self.ahead) - len(self.retry)
+
+    def mark_done(self, index: int):
+        """弹幕已发送成功或失败后不应再发送"""
+        self.retry.discard(index)
+        self._settle(index)
+
+    def mark_retry(self, index: int):
+        """弹幕本次未能发送，下次发送时重新尝试"""
+        self.retry.add(index)
+        self._settle(index)
+
+    def _settle(self, index: int):
+        if index >= self.watermark:
+            self.ahead.add(index)
+            while self.watermark in self.ahead:
+                self.ahead.remove(self.watermark)
+                self.watermark += 1
+        self._unsaved += 1
+        if self._unsaved >= self._save_every or time.monotonic() - self._saved_at >= self._save_interval:
+            self.flush()
+
+    def flush(self):
+        if self._save is None or not self._unsaved:
+            return
+        self._save(self.watermark, sorted(self.ahead), sorted(self.retry))
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
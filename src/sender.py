@@ -0,0 +1,270 @@
+"""多账号并发弹幕发送模块
+
+每个账号拥有独立的令牌桶和退避状态，发送线程从队列中按顺序取出弹幕，
+交给当前有余量的账号发送。某个账号触发频率限制时只延长该账号的发送
+间隔，其余账号不受影响。
+"""
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from logger import logger
+
+
+class SendOutcome(Enum):
+    """单条弹幕的发送结果"""
+    OK = 'ok'
+    RATE_LIMITED = 'rate_limited'  # 36703 发送频率过快，需重新排队
+    AUTH_FAILED = 'auth_failed'  # Cookie 失效，Cookie 更新前暂停使用该账号
+    ERROR = 'error'  # 网络错误等请求失败，需重新排队
+    FAILED = 'failed'  # 其他错误，丢弃该条弹幕
+    ABANDONED = 'abandoned'  # 没有可用的账号，未发送
+
+
+# 换一个账号重新发送的结果
+RETRY_OUTCOMES = (SendOutcome.RATE_LIMITED, SendOutcome.AUTH_FAILED, SendOutcome.ERROR)
+# 暂不可用的账号重新检查状态的间隔(秒)
+HEALTH_RECHECK = 1.0
+# Cookie 失效的账号在 Cookie 更新前暂停使用的时间(秒)
+AUTH_FAILED_BLOCK = 60.0
+
+
+class TokenBucket:
+    """令牌桶限速器，每 ``interval`` 秒生成一个令牌，最多积累 ``capacity`` 个"""
+
+    def __init__(self, interval: float, capacity: int = 1):
+        self.interval = interval
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.interval <= 0:
+            self._tokens = self.capacity
+        else:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个可用令牌的秒数"""
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) * self.interval
+
+    def consume(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+
+class AccountState:
+    """账号的限速与退避状态"""
+    __slots__ = ('acc', 'bucket', 'base_interval', 'max_interval', 'blocked_until', 'busy', 'failed_sessdata')
+
+    def __init__(self, acc: dict, send_interval: float, max_interval: float):
+        self.acc = acc
+        self.bucket = TokenBucket(send_interval)
+        self.base_interval = send_interval
+        self.max_interval = max_interval
+        self.blocked_until = 0.0
+        self.busy = False
+        self.failed_sessdata = None  # 发送时被判定失效的 Cookie
+
+    @property
+    def usable(self) -> bool:
+        return not self.acc.get('expired', False)
+
+    def ready_in(self, now: float) -> float:
+        """距离该账号可以发送的秒数，不可用时返回 ``inf``"""
+        if self.busy or not self.usable:
+            return float('inf')
+        if self.failed_sessdata is not None and self.acc.get('sessdata') != self.failed_sessdata:
+            # Cookie 已刷新，解除失效后的暂停
+            self.failed_sessdata = None
+            self.blocked_until = 0.0
+        return max(self.bucket.wait_time(now), self.blocked_until - now, 0.0)
+
+    def on_outcome(self, outcome: SendOutcome, now: float):
+        if outcome is SendOutcome.OK:
+            self.bucket.interval = max(self.bucket.interval * 0.8, self.base_interval)
+        elif outcome is SendOutcome.RATE_LIMITED:
+            self.bucket.interval = min(self.bucket.interval * 2, self.max_interval)
+            self.blocked_until = now + self.bucket.interval
+            logger.warning(f"账号 {self.acc.get('uname')} 频率限制，发送间隔增加到 {self.bucket.interval:.1f} 秒")
+        elif outcome is SendOutcome.AUTH_FAILED:
+            self.failed_sessdata = self.acc.get('sessdata')
+            self.blocked_until = max(self.blocked_until, now + AUTH_FAILED_BLOCK)
+            logger.warning(f"账号 {self.acc.get('uname')} Cookie失效，Cookie更新前暂停使用该账号")
+
+
+class AccountPool:
+    """发送账号池，按令牌桶把账号分配给发送线程
+
+    多个视频的发送任务可以共用同一个账号池：等待账号的线程按先来后到
+    排队，每个线程只会拿到自己 ``accept`` 允许的账号，排在前面的线程
+    优先分配，保证各任务公平地分享账号。``health`` 返回假的账号（如正在
+    刷新Cookie）暂不分配，每隔 ``HEALTH_RECHECK`` 秒重新判断。
+    """
+
+    def __init__(self, accounts: List[dict], send_interval: float, max_interval: float = 60,
+                 health: Optional[Callable[[dict], bool]] = None):
+        self.send_interval = send_interval
+        self.max_interval = max_interval
+        self.health = health
+        self.states: List[AccountState] = []
+        self._cond = threading.Condition()
+        self._waiters: deque = deque()
+        self.sync(accounts)
+
+    def _ready_in(self, state: AccountState, now: float) -> float:
+        wait = state.ready_in(now)
+        if wait != float('inf') and self.health is not None and not self.health(state.acc):
+            wait = max(wait, HEALTH_RECHECK)
+        return wait
+
+    @staticmethod
+    def _key(acc: dict):
+        return acc.get('mid') or acc.get('uname')
+
+    def sync(self, accounts: List[dict]):
+        """与最新的账号列表同步，已有账号保留限速状态，只替换账号信息"""
+        with self._cond:
+            existing = {self._key(s.acc): s for s in self.states}
+            states = []
+            for acc in accounts:
+                if not acc:
+                    continue
+                state = existing.get(self._key(acc))
+                if state is None:
+                    state = AccountState(acc, self.send_interval, self.max_interval)
+                elif state.acc is not acc:
+                    # 账号信息被替换（如重新登录），保留限速状态；Cookie 变化后自动解除失效暂停
+                    state.acc = acc
+                states.append(state)
+            self.states = states
+            self._cond.notify_all()
+
+    def set_send_interval(self, send_interval: float):
+        """修改发送间隔，正在退避中的账号保留更长的间隔"""
+        with self._cond:
+            for state in self.states:
+                backed_off = state.bucket.interval > state.base_interval
+                state.base_interval = send_interval
+                if not backed_off or state.bucket.interval < send_interval:
+                    state.bucket.interval = send_interval
+            self.send_interval = send_interval
+            self._cond.notify_all()
+
+    def acquire(self, accept: Optional[Callable[[dict], bool]] = None) -> Optional[AccountState]:
+        """等待并占用一个可发送的账号
+
+        ``accept`` 用于限定可用的账号；可用账号全部失效时返回 ``None``。
+        """
+        ticket = (object(), accept)
+        with self._cond:
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    mine = [s for s in self.states if accept is None or accept(s.acc)]
+                    ready = [s for s in self.states if self._ready_in(s, now) <= 0]
+
+                    # 按排队顺序分配：排在前面且能用到已就绪账号的线程优先
+                    claimed = set()
+                    for waiter in self._waiters:
+                        waiter_accept = waiter[1]
+                        choice = next((s for s in ready if id(s) not in claimed
+                                       and (waiter_accept is None or waiter_accept(s.acc))), None)
+                        if waiter is ticket:
+                            if choice is not None:
+                                choice.busy = True
+                                choice.bucket.consume(now)
+                                return choice
+                            break
+                        if choice is not None:
+                            claimed.add(id(choice))
+
+                    wait = min((self._ready_in(s, now) for s in mine), default=float('inf'))
+                    if wait == float('inf') and not any(s.busy for s in mine):
+                        return None
+                    self._cond.wait(None if wait == float('inf') or wait <= 0 else wait)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, state: AccountState, outcome: SendOutcome):
+        with self._cond:
+            state.busy = False
+            state.on_outcome(outcome, time.monotonic())
+            self._cond.notify_all()
+
+
+def send_all(
+    pool: AccountPool,
+    total: int,
+    send_func: Callable[[int, dict], SendOutcome],
+    concurrency: int,
+    max_retries: int = 3,
+    on_done: Optional[Callable[[int, SendOutcome], None]] = None,
+    accept: Optional[Callable[[dict], bool]] = None,
+) -> Dict[SendOutcome, int]:
+    """用 ``concurrency`` 个线程并发发送下标为 ``0..total-1`` 的弹幕
+
+    ``send_func(index, acc)`` 负责实际发送并返回结果。被限速的弹幕重新
+    排到队首交给其他账号，最多重试 ``max_retries`` 次。每条弹幕最终确定
+    结果后调用 ``on_done(index, outcome)``。``accept`` 限定本次可用的账号。
+    返回各结果的计数。
+    """
+    queue = deque((i, 0) for i in range(total))
+    cond = threading.Condition()
+    outstanding = total
+    stats = {outcome: 0 for outcome in SendOutcome}
+
+    def finish(index: int, outcome: SendOutcome):
+        nonlocal outstanding
+        outstanding -= 1
+        stats[outcome] += 1
+        if on_done is not None:
+            on_done(index, outcome)
+
+    def worker():
+        while True:
+            with cond:
+                while not queue and outstanding > 0:
+                    cond.wait()
+                if outstanding == 0:
+                    return
+                index, attempts = queue.popleft()
+
+            state = pool.acquire(accept)
+            if state is None:
+                with cond:
+                    logger.error(f"没有可用的发送账号，放弃剩余 {len(queue) + 1} 条弹幕")
+                    finish(index, SendOutcome.ABANDONED)
+                    while queue:
+                        finish(queue.popleft()[0], SendOutcome.ABANDONED)
+                    cond.notify_all()
+                return
+
+            try:
+                outcome = send_func(index, state.acc)
+            except Exception:
+                logger.exception("发送弹幕报错")
+                outcome = SendOutcome.FAILED
+            pool.release(state, outcome)
+
+            with cond:
+                if outcome in RETRY_OUTCOMES and attempts < max_retries:
+                    queue.appendleft((index, attempts + 1))
+                else:
+                    finish(index, outcome)
+                cond.notify_all()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats
@@ -1,17 +1,171 @@
 import json
-from typing import List, Dict
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional
 
-class Storage:
-    def __init__(self, file_path: str):
-        self.file_path = file_path
-        
-    def load(self) -> List[Dict]:
+
+class PendingStore:
+    """基于 SQLite（WAL 模式）的待处理记录存储
+
+    每次增删改都是一个独立事务，``add_pending_record`` 与监控进程可以同时
+    读写而不会丢失记录。记录以 ``(title_keyword, after_timestamp)`` 为键。
+    首次打开时自动导入旧的 ``pending_records.json``。同一个数据库中还保存
+    各分P的弹幕发送进度，用于中断后继续发送。
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_records (
+                title_keyword TEXT NOT NULL,
+                after_timestamp INTEGER NOT NULL,
+                PRIMARY KEY (title_keyword, after_timestamp)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_keyword ON pending_records (title_keyword)")
+        # 每个分P的发送进度，source 为生成发送计划的 XML 指纹
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS send_progress (
+                bvid TEXT NOT NULL,
+                cid INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                watermark INTEGER NOT NULL,
+                ahead TEXT NOT NULL,
+                retry TEXT NOT NULL DEFAULT '[]',
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (bvid, cid)
+            )
+        """)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(send_progress)")}
+        if 'retry' not in columns:
+            try:
+                self._conn.execute("ALTER TABLE send_progress ADD COLUMN retry TEXT NOT NULL DEFAULT '[]'")
+            except sqlite3.OperationalError:
+                pass  # 另一个进程已添加该列
+        if legacy_json_path:
+            self._migrate(legacy_json_path)
+        # 其他连接提交事务后 data_version 会变化，用于判断缓存是否过期
+        self._data_version: Optional[int] = None
+        self._cache: List[Dict] = []
+
+    def _migrate(self, json_path: str):
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(json_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
         except FileNotFoundError:
-            return []
-            
-    def save(self, data: List[Dict]):
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4) 
\ No newline at end of file
+            return  # 没有旧文件，或另一个进程已完成导入
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO pending_records (title_keyword, after_timestamp) VALUES (?, ?)",
+                    [(r['title_keyword'], int(r['after_timestamp'])) for r in records]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        try:
+            os.replace(json_path, f"{json_path}.migrated")
+        except FileNotFoundError:
+            pass  # 另一个进程已完成导入
+
+    def _current_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self) -> List[Dict]:
+        """按添加顺序返回全部记录，没有变化时不重新查询"""
+        with self._lock:
+            version = self._current_version()
+            if version != self._data_version:
+                rows = self._conn.execute(
+                    "SELECT title_keyword, after_timestamp FROM pending_records ORDER BY rowid"
+                ).fetchall()
+                self._cache = [dict(row) for row in rows]
+                self._data_version = version
+            return list(self._cache)
+
+    def find(self, title_keyword: str) -> List[Dict]:
+        """按标题关键词查找记录"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title_keyword, after_timestamp FROM pending_records WHERE title_keyword = ? ORDER BY rowid",
+                (title_keyword,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            # 本连接的写入不会改变 data_version，需要手动使缓存失效
+            self._data_version = None
+            return cursor.rowcount
+
+    def add(self, title_keyword: str, after_timestamp: int, unique_keyword: bool = False) -> bool:
+        """添加记录，``unique_keyword`` 为真时已存在相同关键词的记录则不添加
+
+        记录已存在时返回 ``False``。
+        """
+        if unique_keyword:
+            sql = """
+                INSERT INTO pending_records (title_keyword, after_timestamp)
+                SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM pending_records WHERE title_keyword = ?)
+            """
+            params = (title_keyword, after_timestamp, title_keyword)
+        else:
+            sql = "INSERT OR IGNORE INTO pending_records (title_keyword, after_timestamp) VALUES (?, ?)"
+            params = (title_keyword, after_timestamp)
+        return self._write(sql, params) > 0
+
+    def remove(self, title_keyword: str, after_timestamp: int) -> bool:
+        return self._write(
+            "DELETE FROM pending_records WHERE title_keyword = ? AND after_timestamp = ?",
+            (title_keyword, after_timestamp)
+        ) > 0
+
+    def update(self, title_keyword: str, after_timestamp: int, new_after_timestamp: int) -> bool:
+        """修改记录的起始时间戳"""
+        return self._write(
+            "UPDATE OR IGNORE pending_records SET after_timestamp = ? WHERE title_keyword = ? AND after_timestamp = ?",
+            (new_after_timestamp, title_keyword, after_timestamp)
+        ) > 0
+
+    def get_progress(self, bvid: str, cid: int) -> Optional[tuple[str, int, List[int], List[int]]]:
+        """读取分P的发送进度 ``(source, watermark, ahead, retry)``，没有记录时返回 ``None``"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, watermark, ahead, retry FROM send_progress WHERE bvid = ? AND cid = ?", (bvid, cid)
+            ).fetchone()
+        if row is None:
+            return None
+        return row['source'], row['watermark'], json.loads(row['ahead']), json.loads(row['retry'])
+
+    def save_progress(self, bvid: str, cid: int, source: str, watermark: int, ahead: List[int],
+                      retry: List[int] = ()):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO send_progress (bvid, cid, source, watermark, ahead, retry, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (bvid, cid, source, watermark, json.dumps(ahead), json.dumps(list(retry)), time.time())
+            )
+
+    def has_progress(self, source: str) -> bool:
+        """是否有按 ``source`` 对应的发送计划保存的发送进度"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM send_progress WHERE source = ? LIMIT 1", (source,)).fetchone()
+        return row is not None
+
+    def clear_progress(self, bvid: str, cid: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM send_progress WHERE bvid = ? AND cid = ?", (bvid, cid))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,51 @@
+"""biliup 后处理使用的轻量客户端
+
+从标准输入读取 biliup 传入的JSON，通过 ``config/monitor.sock`` 交给正在
+运行的监控进程写入待处理记录。只依赖标准库，启动只需几十毫秒。监控
+未运行时退回到 ``add_pending_record`` 直接写入数据库。
+"""
+import json
+import os
+import socket
+import sys
+
+# 与 notify.SOCKET_PATH 相同，这里不导入 notify 以免加载日志等模块
+SOCKET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'monitor.sock')
+
+
+def submit(data: dict, path: str = SOCKET_PATH, timeout: float = 5) -> str | None:
+    """提交记录并返回监控的回复，监控未运行时返回 ``None``"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    payload = json.dumps({'title': data.get('title'), 'end_time': data.get('end_time', 0)}, ensure_ascii=False)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(f"add {payload}\n".encode('utf-8'))
+            reply = b''
+            while not reply.endswith(b'\n'):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+    except OSError:
+        return None
+    return reply.decode('utf-8').strip() or None
+
+
+def main():
+    data = json.load(sys.stdin)
+    reply = submit(data)
+    if reply is None:
+        # 监控未运行，直接写入待处理记录
+        from add_pending_record import main as add_main
+        add_main(data)
+        return
+    print(f"监控已接收: {reply}")
+    if reply.startswith('error'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""弹幕文本清洗模块"""
+from functools import lru_cache
+
+# 允许发送的字符：汉字、拉丁字母、数字、空白和常用标点
+ALLOWED_PATTERN = r'[\p{Han}\p{Latin}0-9\s.,!?？。，！；（）：‘’【】、;:\'"\-()（）\[\]{}…—·~`@#&*+=<>%$^|\\/]'
+
+
+@lru_cache(maxsize=None)
+def _allowed():
+    """第一次清洗文本时才导入 ``regex`` 并编译"""
+    import regex
+    return regex.compile(ALLOWED_PATTERN)
+
+
+class _TranslateTable(dict):
+    """按需填充的 ``str.translate`` 映射表
+
+    每个码位只在第一次出现时用正则判断一次，之后直接查表：
+    允许的字符映射为自身，其他字符映射为 ``None`` 即删除。
+    """
+
+    def __missing__(self, code: int):
+        value = code if _allowed().match(chr(code)) else None
+        self[code] = value
+        return value
+
+
+_table = _TranslateTable()
+
+
+@lru_cache(maxsize=65536)
+def clean_text(text: str) -> str:
+    """删除文本中不允许发送的字符"""
+    return text.translate(_table)
@@ -37,8 +37,8 @@ if [ -f "requirements.txt" ]; then
     pip install -r requirements.txt >/dev/null
 fi
 
-# 检查配置文件
-if ! grep -q "csrf:" config/config.yaml || ! grep -q "sessdata:" config/config.yaml; then
+# 检查账号配置（旧版账号写在配置文件中，启动后会自动迁移到 config/accounts/）
+if ! ls config/accounts/*.json >/dev/null 2>&1 && { ! grep -q "csrf:" config/config.yaml || ! grep -q "sessdata:" config/config.yaml; }; then
     echo "错误: 未找到账号配置，请先运行 ./login.sh 添加账号"
     exit 1
 fi
@@ -0,0 +1,134 @@
+"""用本地桩服务器验证 AsyncBilibiliClient 的各个接口
+
+需要安装 aiohttp。配置只在内存中修改，账号写入临时目录。
+
+用法: python test/async_client.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import yaml
+from aiohttp import web
+
+from account_store import AccountStore
+from async_api import AsyncBilibiliClient
+from config import config
+
+ACC = {'uname': 'tester', 'mid': 1, 'level': 6, 'csrf': 'old_csrf', 'sessdata': 'old_sess', 'refresh_token': 'rt'}
+
+
+def build_stub() -> web.Application:
+    state = {'posts': 0}
+
+    async def nav(request):
+        return web.json_response({'code': 0, 'data': {
+            'mid': 1, 'uname': 'tester', 'level_info': {'current_level': 6},
+            'wbi_img': {'img_url': 'https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png',
+                        'sub_url': 'https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png'},
+        }})
+
+    async def view(request):
+        return web.json_response({'code': 0, 'data': {'pages': [
+            {'cid': 100, 'part': 'P1', 'duration': 3600}, {'cid': 101, 'part': 'P2', 'duration': 1800},
+        ]}})
+
+    async def arc_search(request):
+        assert 'w_rid' in request.query
+        return web.json_response({'code': 0, 'data': {'list': {'vlist': [
+            {'bvid': 'BV_old', 'title': '直播回放 测试', 'created': 900},
+            {'bvid': 'BV_new', 'title': '直播回放 测试', 'created': 1100, 'is_self_view': True},
+        ]}}})
+
+    async def dm_post(request):
+        form = await request.post()
+        state['posts'] += 1
+        if 'SESSDATA=old_sess' in request.headers.get('Cookie', ''):
+            return web.json_response({'code': -101})
+        assert form['csrf'] == 'new_csrf'
+        return web.json_response({'code': 0})
+
+    async def cookie_info(request):
+        return web.json_response({'code': 0, 'data': {'refresh': True}})
+
+    async def correspond(request):
+        return web.Response(text='<div id="1-name">refresh_csrf_value</div>', content_type='text/html')
+
+    async def cookie_refresh(request):
+        form = await request.post()
+        assert form['refresh_csrf'] == 'refresh_csrf_value'
+        resp = web.json_response({'code': 0, 'data': {'refresh_token': 'new_rt'}})
+        resp.set_cookie('SESSDATA', 'new_sess')
+        resp.set_cookie('bili_jct', 'new_csrf')
+        return resp
+
+    async def confirm_refresh(request):
+        return web.json_response({'code': 0})
+
+    app = web.Application()
+    app['state'] = state
+    app.router.add_get('/x/web-interface/nav', nav)
+    app.router.add_get('/x/web-interface/view', view)
+    app.router.add_get('/x/space/wbi/arc/search', arc_search)
+    app.router.add_post('/x/v2/dm/post', dm_post)
+    app.router.add_get('/x/passport-login/web/cookie/info', cookie_info)
+    app.router.add_get(r'/correspond/1/{path}', correspond)
+    app.router.add_post('/x/passport-login/web/cookie/refresh', cookie_refresh)
+    app.router.add_post('/x/passport-login/web/confirm/refresh', confirm_refresh)
+    return app
+
+
+def setup_config(base: str, acc: dict, tmp: str):
+    with open(os.path.join(ROOT, 'config', 'config.yaml'), 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    data['bilibili'].update(accounts=[acc], api_base=base, passport_base=base, www_base=base)
+    config._config = data
+    config.account_store = AccountStore(os.path.join(tmp, 'accounts'))
+
+
+async def main():
+    app = build_stub()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f'http://127.0.0.1:{port}'
+
+    acc = dict(ACC)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            setup_config(base, acc, tmp)
+            await run_checks(app, acc)
+    finally:
+        await runner.cleanup()
+    print("AsyncBilibiliClient 桩服务器测试通过")
+
+
+async def run_checks(app: web.Application, acc: dict):
+    async with AsyncBilibiliClient() as client:
+        assert await client.get_user_info('x') == (True, {'mid': 1, 'uname': 'tester', 'level': 6})
+        assert await client.get_video_parts(acc, 'BV_new') == [(100, 'P1', 3600), (101, 'P2', 1800)]
+        assert await client.check_up_latest_video(acc, 1, '测试', 1000) == ('BV_new', True)
+
+        # 并发轮询多个关键词
+        results = await asyncio.gather(*(client.check_up_latest_video(acc, 1, '测试', ts) for ts in (0, 950, 2000)))
+        assert results == [('BV_old', False), ('BV_new', True), ('', False)]
+
+        # Cookie 失效后刷新并重试
+        success, message, _ = await client.send_danmaku(100, 'hello', 'BV_new', 0, 16777215, acc)
+        assert success, message
+        assert acc['sessdata'] == 'new_sess' and acc['csrf'] == 'new_csrf' and acc['refresh_token'] == 'new_rt'
+        assert app['state']['posts'] == 2
+        assert os.path.exists(os.path.join(config.account_store.directory, '1.json'))  # 新Cookie已保存
+
+    from metrics import metrics
+    assert 'endpoint="/x/v2/dm/post"' in metrics.render()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
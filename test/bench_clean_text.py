@@ -0,0 +1,68 @@
+"""clean_text 微基准：验证查表实现与逐字符正则实现等价，并对比耗时
+
+用法: python test/bench_clean_text.py [XML文件...] [-n 重复次数]
+默认使用 danmaku/ 目录下的全部 XML 文件。
+"""
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import regex
+
+from danmaku_parser import load_records
+from text_cleaner import ALLOWED_PATTERN, clean_text
+
+
+def clean_text_regex(text):
+    """原实现：每个字符调用一次未编译的 regex.match"""
+    return ''.join(c for c in text if regex.match(ALLOWED_PATTERN, c))
+
+
+def load_messages(paths):
+    messages = []
+    for path in paths:
+        records = load_records(path)
+        messages.extend(records.message(i) for i in range(len(records)))
+    return messages
+
+
+def timeit(func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for m in messages:
+            func(m)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 200
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    paths = args or sorted(glob.glob(os.path.join(ROOT, 'danmaku', '*.xml')))
+    messages = load_messages(paths)
+    if not messages:
+        print("没有可用的弹幕")
+        sys.exit(1)
+
+    # 等价性：样本消息 + 整个基本多文种平面
+    for m in messages:
+        assert clean_text(m) == clean_text_regex(m), m
+    bmp = ''.join(chr(c) for c in range(0x10000) if not 0xD800 <= c <= 0xDFFF)
+    assert clean_text.__wrapped__(bmp) == clean_text_regex(bmp)
+
+    old = timeit(clean_text_regex, messages, repeat)
+    new_cold = timeit(clean_text.__wrapped__, messages, repeat)
+    clean_text.cache_clear()
+    new = timeit(clean_text, messages, repeat)
+    total = len(messages) * repeat
+    print(f"消息数: {len(messages)} x {repeat}")
+    print(f"逐字符正则:     {old:.3f}s ({old / total * 1e6:.2f} us/条)")
+    print(f"查表(无缓存):   {new_cold:.3f}s ({new_cold / total * 1e6:.2f} us/条) 提升 {old / new_cold:.1f}x")
+    print(f"查表+LRU缓存:   {new:.3f}s ({new / total * 1e6:.2f} us/条) 提升 {old / new:.1f}x")
@@ -0,0 +1,73 @@
+"""各入口模块的导入耗时，并检查重量级依赖没有在导入时被加载
+
+基于 ``python -X importtime``，每个入口在独立的子进程中导入，取多次运行的
+中位数。导入了不该加载的模块、或耗时超过 ``--budget`` 倍基准时退出码为 1。
+
+用法: python test/bench_import.py [--runs 5] [--budget 2.0]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+HEAVY = ('Crypto', 'qrcode', 'PIL', 'regex', 'yaml', 'numpy', 'aiohttp')
+
+# 入口模块 -> (导入时不允许加载的模块, 参考耗时(毫秒))
+ENTRY_POINTS = {
+    'submit_record': (HEAVY + ('logger', 'requests', 'sqlite3'), 15),
+    'add_pending_record': (HEAVY + ('requests',), 40),
+    'login': (HEAVY, 120),
+    'api': (HEAVY, 150),
+    'main': (HEAVY, 170),
+}
+
+
+def import_profile(module: str) -> tuple[float, set]:
+    """返回导入 ``module`` 的累计耗时(毫秒)和加载的全部顶层包"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue  # 表头
+        name = name.strip()
+        loaded.add(name.split('.')[0])
+        if name == module:
+            total = int(cumulative) / 1000
+    return total, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=2.0, help='允许超过参考耗时的倍数')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'入口':<20}{'耗时(ms)':>10}{'参考(ms)':>10}  不应加载的模块")
+    for module, (forbidden, reference) in ENTRY_POINTS.items():
+        timings = []
+        loaded = set()
+        for _ in range(args.runs):
+            elapsed, loaded = import_profile(module)
+            timings.append(elapsed)
+        elapsed = statistics.median(timings)
+        unexpected = sorted(name for name in forbidden if name in loaded)
+        too_slow = elapsed > reference * args.budget
+        failed |= bool(unexpected) or too_slow
+        print(f"{module:<20}{elapsed:>10.1f}{reference:>10}  {', '.join(unexpected) or '-'}{'  超时' if too_slow else ''}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""解析 → 过滤 → 清洗 → 发送计划 各阶段的基准测试
+
+用合成的 XML 分别测量 ``load_records``、``filter_danmaku``、``clean_text``、
+收益统计以及发送计划生成/读取的耗时和峰值内存。耗时取多次运行的最小值
+（不开启 tracemalloc），峰值内存单独运行一次用 tracemalloc 统计。
+
+用法::
+
+    python test/bench_pipeline.py --hours 6 --density 120 --gift-ratio 0.05 \\
+        --duplicate-ratio 0.3 --uname-length 8 --repeat 3 --output bench.jsonl
+
+``--output`` 把结果连同参数、git 提交追加为一行 JSON，便于长期对比。
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.sax.saxutils import escape, quoteattr
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import text_cleaner
+from api import filter_danmaku
+from danmaku_parser import load_records
+from send_plan import SendPlan
+from text_cleaner import clean_text
+
+WORDS = ['哈哈哈', '666', '好耶', '来了', '主播好', 'hello', 'lol', '？？？', '草', '笑死',
+         '这波可以', 'gg', '晚上好', '打卡', '正在参与 抽奖', '😀', '🎉🎉', 'ｗｗｗ', '牛', '下次一定']
+GIFTS = ['小心心', '辣条', '粉丝团灯牌', '点亮了', '小花花', '打call', '棒棒糖', '告白气球']
+BASE_TIMESTAMP = 1700000000
+
+
+def generate_xml(path: str, hours: float, density: float, gift_ratio: float, duplicate_ratio: float,
+                 uname_length: int, seed: int = 0) -> int:
+    """生成录播弹幕 XML，返回写入的条数
+
+    ``density`` 为每分钟的弹幕数，``gift_ratio`` 为礼物占比，
+    ``duplicate_ratio`` 为重复之前出现过的内容的比例。
+    """
+    rng = random.Random(seed)
+    total = int(hours * 60 * density)
+    duration = hours * 3600
+    users = [(rng.randint(1, 10 ** 12), ''.join(rng.choice('abcdefg用户名主播粉丝') for _ in range(uname_length)))
+             for _ in range(max(total // 20, 1))]
+    seen = []
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<i>\n")
+        for t in sorted(rng.uniform(0, duration) for _ in range(total)):
+            uid, uname = rng.choice(users)
+            ts = BASE_TIMESTAMP + int(t)
+            if rng.random() < gift_ratio:
+                gift = rng.choice(GIFTS)
+                f.write(f'  <s timestamp="{ts}" uid="{uid}" username={quoteattr(uname)} price="{rng.randint(0, 5000)}" '
+                        f'type="gift" num="{rng.randint(1, 10)}" giftname="{gift}"/>\n')
+                continue
+            if seen and rng.random() < duplicate_ratio:
+                content = rng.choice(seen)
+            else:
+                content = ''.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + str(rng.randint(0, 999))
+                seen.append(content)
+            f.write(f'  <d p="{t:.3f},1,25,16777215,{ts},0,{uid},0" timestamp="{ts}" uid="{uid}" '
+                    f'user={quoteattr(uname)}>{escape(content)}</d>\n')
+        f.write("</i>\n")
+    return total
+
+
+def measure(func, repeat: int):
+    """返回 (结果, 最短耗时秒, 峰值内存字节)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def clean_cold(messages):
+    """清空缓存后清洗，模拟进程刚启动时的情况"""
+    clean_text.cache_clear()
+    text_cleaner._table.clear()
+    return [clean_text(m) for m in messages]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=4)
+    parser.add_argument('--density', type=float, default=60, help='每分钟弹幕数')
+    parser.add_argument('--gift-ratio', type=float, default=0.05)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.3)
+    parser.add_argument('--uname-length', type=int, default=8)
+    parser.add_argument('--max-count-per-hour', type=int, default=500)
+    parser.add_argument('--max-repeat-count', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--numpy', action='store_true', help='使用 NumPy 抽稀')
+    parser.add_argument('--output', help='追加结果的 JSON Lines 文件')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = os.path.join(tmp, 'bench.xml')
+        count = generate_xml(xml_path, args.hours, args.density, args.gift_ratio,
+                             args.duplicate_ratio, args.uname_length, args.seed)
+        size = os.path.getsize(xml_path)
+        print(f"合成XML: {count} 条, {size / 1024 / 1024:.1f} MiB")
+
+        results = {}
+        records, results['parse'], results['parse_mem'] = measure(lambda: load_records(xml_path), args.repeat)
+        filtered, results['filter'], results['filter_mem'] = measure(
+            lambda: filter_danmaku(records, args.max_count_per_hour, args.max_repeat_count, use_numpy=args.numpy),
+            args.repeat)
+        _, results['earnings'], results['earnings_mem'] = measure(records.total_price, args.repeat)
+        messages = [records.message(i) for i in filtered]
+        cleaned, results['clean'], results['clean_mem'] = measure(lambda: clean_cold(messages), args.repeat)
+
+        plan_path = os.path.join(tmp, 'bench.plan')
+
+        def build_plan():
+            plan = SendPlan.build([records.timestamps[i] for i in filtered],
+                                  [16776960 if records.is_gift(i) else 16777215 for i in filtered],
+                                  cleaned, records.total_price(), 'bench')
+            plan.save(plan_path)
+            return plan
+
+        _, results['plan_build'], results['plan_build_mem'] = measure(build_plan, args.repeat)
+        plan, results['plan_load'], results['plan_load_mem'] = measure(lambda: SendPlan.load(plan_path), args.repeat)
+        assert len(plan) == len(filtered)
+
+    print(f"过滤后: {len(filtered)} 条")
+    print(f"{'阶段':<12}{'耗时(ms)':>12}{'峰值内存(MiB)':>16}")
+    for stage in ('parse', 'filter', 'clean', 'earnings', 'plan_build', 'plan_load'):
+        print(f"{stage:<12}{results[stage] * 1000:>12.2f}{results[stage + '_mem'] / 1024 / 1024:>16.2f}")
+
+    if args.output:
+        params = {k: v for k, v in vars(args).items() if k != 'output'}
+        entry = {'time': int(time.time()), 'commit': git_commit(), 'params': params,
+                 'count': count, 'filtered': len(filtered), 'results': results}
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        print(f"结果已追加到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
-import regex
+import os
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
 
-def clean_text(text):
-    return ''.join(c for c in text if regex.match(r'[\p{Han}\p{Latin}0-9\s.,!?？。，！；（）：‘’【】、;:\'"\-()（）\[\]{}…—·~`@#&*+=<>%$^|\\/]', c))
+from text_cleaner import clean_text
 
 if __name__ == "__main__":
     res = clean_text(input())
-    print(res)
\ No newline at end of file
+    print(res)
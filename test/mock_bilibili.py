@@ -0,0 +1,289 @@
+"""本地模拟的B站接口，用于离线测试发送流程
+
+实现 ``/x/v2/dm/post``、``/x/web-interface/view``、``/x/space/wbi/arc/search``、
+``/x/web-interface/nav``，以及刷新Cookie用到的 ``cookie/info``、``correspond``、
+``cookie/refresh``、``confirm/refresh``。把 ``bilibili.api_base`` 等配置指向
+:attr:`MockBilibili.url` 即可让 ``api.py`` 请求本服务。
+
+* 每个账号按 ``interval`` 秒限速，发送过快时返回 36703
+* 账号成功发送 ``expire_after`` 条后 Cookie 失效，之后返回 -101；
+  ``refreshable`` 为真时可以通过刷新接口换到新的 SESSDATA
+* 每个请求先等待 ``latency`` 秒，再加上 ``0 ~ jitter`` 秒的随机延迟
+
+单独运行时在前台提供服务: python test/mock_bilibili.py --port 8000 --accounts 3
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+WBI_IMG = 'https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png'
+WBI_SUB = 'https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png'
+
+
+class MockAccount:
+    def __init__(self, mid: int, uname: str, sessdata: str, csrf: str, interval: float,
+                 expire_after: Optional[int]):
+        self.mid = mid
+        self.uname = uname
+        self.sessdata = sessdata
+        self.csrf = csrf
+        self.refresh_token = f"token_{mid}_0"
+        self.interval = interval
+        self.expire_after = expire_after
+        self.sent_since_login = 0
+        self.last_post = float('-inf')
+        self.generation = 0
+        self.stats = Counter()
+
+    @property
+    def expired(self) -> bool:
+        return self.expire_after is not None and self.sent_since_login >= self.expire_after
+
+    def to_config(self) -> dict:
+        """``config.bilibili['accounts']`` 中的账号格式"""
+        return {'sessdata': self.sessdata, 'csrf': self.csrf, 'refresh_token': self.refresh_token,
+                'mid': self.mid, 'uname': self.uname, 'level': 6, 'expired': False}
+
+
+class MockBilibili:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, interval: float = 0.0,
+                 latency: float = 0.0, jitter: float = 0.0, expire_after: Optional[int] = None,
+                 refreshable: bool = True, videos: Optional[Dict[str, list]] = None, seed: int = 0):
+        self.interval = interval
+        self.latency = latency
+        self.jitter = jitter
+        self.expire_after = expire_after
+        self.refreshable = refreshable
+        # bvid -> [(cid, part, duration)]
+        self.videos = videos or {}
+        self.accounts: Dict[int, MockAccount] = {}
+        self.stats = Counter()
+        self.danmaku: Dict[int, list] = {}
+        self._by_sessdata: Dict[str, MockAccount] = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_account(self, mid: int, uname: str = '', interval: Optional[float] = None,
+                    expire_after: Optional[int] = None) -> dict:
+        """注册账号，``interval``、``expire_after`` 不传时使用全局设置，返回配置格式的账号"""
+        acc = MockAccount(mid, uname or f"mock{mid}", f"sess_{mid}_0", f"csrf_{mid}_0",
+                          self.interval if interval is None else interval,
+                          self.expire_after if expire_after is None else expire_after)
+        with self._lock:
+            self.accounts[mid] = acc
+            self._by_sessdata[acc.sessdata] = acc
+        return acc.to_config()
+
+    def add_video(self, bvid: str, parts: list):
+        """``parts`` 为 ``[(cid, part, duration)]``"""
+        self.videos[bvid] = parts
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-bilibili', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 接口实现，返回 (JSON, 额外的响应头) ----
+
+    def _account(self, cookies: Dict[str, str]) -> Optional[MockAccount]:
+        return self._by_sessdata.get(cookies.get('SESSDATA', ''))
+
+    def nav(self, cookies, query, form):
+        data = {'wbi_img': {'img_url': WBI_IMG, 'sub_url': WBI_SUB}, 'isLogin': False}
+        acc = self._account(cookies)
+        if acc is None or acc.expired:
+            return {'code': -101, 'message': '账号未登录', 'data': data}
+        data.update(isLogin=True, mid=acc.mid, uname=acc.uname, level_info={'current_level': 6})
+        return {'code': 0, 'message': '0', 'data': data}
+
+    def view(self, cookies, query, form):
+        parts = self.videos.get(query.get('bvid', ''))
+        if parts is None:
+            return {'code': -404, 'message': '啥都木有'}
+        pages = [{'cid': cid, 'page': i + 1, 'part': part, 'duration': duration}
+                 for i, (cid, part, duration) in enumerate(parts)]
+        return {'code': 0, 'message': '0', 'data': {'bvid': query['bvid'], 'pages': pages}}
+
+    def arc_search(self, cookies, query, form):
+        now = int(time.time())
+        keyword = query.get('keyword', '')
+        vlist = [{'bvid': bvid, 'title': keyword or bvid, 'created': now, 'mid': int(query.get('mid', 0))}
+                 for bvid in self.videos]
+        return {'code': 0, 'message': '0', 'data': {'list': {'vlist': vlist}, 'page': {'count': len(vlist)}}}
+
+    def dm_post(self, cookies, query, form):
+        with self._lock:
+            acc = self._account(cookies)
+            self.stats['post'] += 1
+            if acc is None or acc.expired:
+                self.stats['expired'] += 1
+                if acc is not None:
+                    acc.stats['expired'] += 1
+                return {'code': -101, 'message': '账号未登录'}
+            if form.get('csrf') != acc.csrf:
+                self.stats['csrf'] += 1
+                return {'code': -111, 'message': 'csrf校验失败'}
+            now = time.monotonic()
+            if now - acc.last_post < acc.interval:
+                self.stats['rate_limited'] += 1
+                acc.stats['rate_limited'] += 1
+                return {'code': 36703, 'message': '发送频率过快'}
+            acc.last_post = now
+            acc.sent_since_login += 1
+            acc.stats['ok'] += 1
+            self.stats['ok'] += 1
+            self.danmaku.setdefault(int(form.get('oid', 0)), []).append(form.get('msg', ''))
+        return {'code': 0, 'message': '0', 'data': {'dmid': self.stats['ok']}}
+
+    def cookie_info(self, cookies, query, form):
+        acc = self._account(cookies)
+        if acc is None:
+            return {'code': -101, 'message': '账号未登录'}
+        return {'code': 0, 'message': '0', 'data': {'refresh': acc.expired, 'timestamp': int(time.time() * 1000)}}
+
+    def correspond(self, cookies, query, form):
+        acc = self._account(cookies)
+        csrf = f"refresh_csrf_{acc.mid}" if acc is not None and self.refreshable else ''
+        return f'<html><body><div id="1-name">{csrf}</div></body></html>'
+
+    def cookie_refresh(self, cookies, query, form):
+        with self._lock:
+            acc = self._account(cookies)
+            if acc is None or not self.refreshable or form.get('refresh_token') != acc.refresh_token:
+                return {'code': -101, 'message': '账号未登录'}
+            del self._by_sessdata[acc.sessdata]
+            acc.generation += 1
+            acc.sessdata = f"sess_{acc.mid}_{acc.generation}"
+            acc.csrf = f"csrf_{acc.mid}_{acc.generation}"
+            acc.refresh_token = f"token_{acc.mid}_{acc.generation}"
+            acc.sent_since_login = 0
+            acc.stats['refreshed'] += 1
+            self.stats['refreshed'] += 1
+            self._by_sessdata[acc.sessdata] = acc
+        headers = [('Set-Cookie', f"SESSDATA={acc.sessdata}; Path=/"), ('Set-Cookie', f"bili_jct={acc.csrf}; Path=/")]
+        return {'code': 0, 'message': '0', 'data': {'refresh_token': acc.refresh_token}}, headers
+
+    def confirm_refresh(self, cookies, query, form):
+        return {'code': 0, 'message': '0'}
+
+    ROUTES = {
+        '/x/web-interface/nav': nav,
+        '/x/web-interface/view': view,
+        '/x/space/wbi/arc/search': arc_search,
+        '/x/v2/dm/post': dm_post,
+        '/x/passport-login/web/cookie/info': cookie_info,
+        '/x/passport-login/web/cookie/refresh': cookie_refresh,
+        '/x/passport-login/web/confirm/refresh': confirm_refresh,
+    }
+
+    def _route(self, path: str):
+        if path.startswith('/correspond/1/'):
+            return MockBilibili.correspond
+        return self.ROUTES.get(path)
+
+    def _delay(self):
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self):
+                url = urllib.parse.urlsplit(self.path)
+                query = dict(urllib.parse.parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode('utf-8'))) if length else {}
+                cookies = {}
+                for item in (self.headers.get('Cookie') or '').split(';'):
+                    name, _, value = item.strip().partition('=')
+                    if name:
+                        cookies[name] = value
+
+                route = mock._route(url.path)
+                mock._delay()
+                if route is None:
+                    self._reply(404, 'text/plain', b'not found')
+                    return
+                result = route(mock, cookies, query, form)
+                headers = []
+                if isinstance(result, tuple):
+                    result, headers = result
+                if isinstance(result, str):
+                    self._reply(200, 'text/html; charset=utf-8', result.encode('utf-8'), headers)
+                else:
+                    self._reply(200, 'application/json; charset=utf-8',
+                                json.dumps(result, ensure_ascii=False).encode('utf-8'), headers)
+
+            def _reply(self, status: int, content_type: str, body: bytes, headers=()):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--interval', type=float, default=5, help='每个账号的最小发送间隔(秒)')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--expire-after', type=int, help='账号成功发送多少条后Cookie失效')
+    args = parser.parse_args()
+
+    mock = MockBilibili(args.host, args.port, args.interval, args.latency, args.jitter, args.expire_after)
+    mock.add_video('BV1mock', [(1001, 'P1', 3600)])
+    accounts = [mock.add_account(10000 + i) for i in range(args.accounts)]
+    print(f"模拟服务: {mock.url}")
+    print(json.dumps(accounts, ensure_ascii=False, indent=2))
+    mock.start()
+    try:
+        while True:
+            time.sleep(10)
+            print(dict(mock.stats))
+    except KeyboardInterrupt:
+        mock.close()
+
+
+if __name__ == "__main__":
+    main()
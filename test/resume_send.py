@@ -0,0 +1,87 @@
+"""验证 auto_send_danmaku 中断后从保存的进度继续发送
+
+用法: python test/resume_send.py
+"""
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import api
+from config import config
+from send_plan import SendPlan, plan_path
+from storage import PendingStore
+
+ACCOUNTS = [{'uname': f'acc{i}', 'mid': i, 'level': 6, 'csrf': 'x', 'sessdata': 'x'} for i in range(1, 4)]
+
+
+def write_xml(path: str, count: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<i>\n')
+        for i in range(count):
+            f.write(f'<d p="{i * 30}.0,1,25,16777215,{1700000000 + i * 30},0,{i},0" user="user{i}">弹幕{i}</d>\n')
+        f.write('</i>\n')
+
+
+def main():
+    config.bilibili['accounts'] = ACCOUNTS
+    config.bilibili['batch_size'] = 3
+    config.danmaku['send_interval'] = 0
+    config.danmaku['max_count_per_hour'] = 10000
+
+    sent = []
+    lock = threading.Lock()
+    crash_after = 40
+    rejected = []
+
+    def fake_send(oid, message, bvid, progress, color, acc):
+        with lock:
+            if crash_after is not None and len(sent) >= crash_after:
+                return False, "请求发生错误: 网络错误", {}  # 模拟中途断网
+            if message == '弹幕5':
+                rejected.append(message)
+                return False, "弹幕内容不合规", {}  # 不可重试的失败，不再发送
+            sent.append(message)
+        return True, "", {}
+
+    api.send_danmaku = fake_send
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = os.path.join(tmp, 'P1.xml')
+        write_xml(xml_path, 100)
+        store = PendingStore(os.path.join(tmp, 'pending.db'))
+
+        try:
+            api.auto_send_danmaku(xml_path, 1, 7200, 'BV1', False, store=store)
+            raise AssertionError("未发送完成时应抛出 SendIncomplete")
+        except api.SendIncomplete as e:
+            print(f"发送中止: {e}")
+        plan = SendPlan.load(plan_path(xml_path))
+        assert plan is not None and len(plan) == 100
+        source, watermark, ahead, retry = store.get_progress('BV1', 1)
+        print(f"中断时已发送 {len(sent)} 条，进度 watermark={watermark} ahead={len(ahead)} retry={len(retry)}")
+        assert rejected == ['弹幕5']
+        assert watermark + len(ahead) - len(retry) == len(sent) + len(rejected) == crash_after + 1
+
+        # 恢复发送：不重新解析XML，已保存进度的弹幕不再发送
+        first_run = list(sent)
+        sent.clear()
+        crash_after = None
+        api.load_records = None  # 如果重新解析会直接报错
+        # 中途修改过滤配置也沿用中断前的计划，新配置从下一个分P开始生效
+        config.danmaku['ban_keywords'] = ['弹幕9']
+        assert not api.prepare_send_plan(xml_path, store.has_progress)
+        api.auto_send_danmaku(xml_path, 1, 7200, 'BV1', False, store=store)
+        print(f"恢复后发送 {len(sent)} 条")
+        assert not set(first_run) & set(sent)
+        assert rejected == ['弹幕5']  # 被拒绝的弹幕不再重发
+        assert len(first_run) + len(sent) + len(rejected) == len(plan)
+        assert store.get_progress('BV1', 1) is not None  # 进度由调用方在发送完成后清除
+        store.close()
+    print("断点续发测试通过")
+
+
+if __name__ == "__main__":
+    main()
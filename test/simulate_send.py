@@ -0,0 +1,137 @@
+"""离线发送模拟：用本地模拟的B站接口跑完整的发送流程
+
+启动 :class:`mock_bilibili.MockBilibili`，把配置中的接口地址指向它，再用
+``auto_send_danmaku`` 发送一份合成（或指定）的录播弹幕，统计实际达到的
+每分钟发送条数、频率限制次数、Cookie 失效/刷新次数和总耗时，用来比较
+``send_interval``、``batch_size``、账号数量等参数的效果。不会读写
+``config/`` 下的文件，也不会请求真实的B站接口。
+
+用法::
+
+    python test/simulate_send.py --accounts 4 --send-interval 1 --interval 1 \\
+        --account-interval 0=3 --expire-after 20 --latency 0.05 --hours 0.1
+
+``--account-interval 序号=秒`` 单独设置某个账号的服务端限速，可重复使用。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml
+
+from account_store import AccountStore
+from config import config
+from logger import logger
+from bench_pipeline import generate_xml, git_commit
+from mock_bilibili import MockBilibili
+
+BVID = 'BV1sim'
+CID = 1001
+
+
+def setup_config(args, mock: MockBilibili, accounts: list, tmp: str):
+    """在内存中替换配置，账号写入临时目录"""
+    with open(os.path.join(ROOT, 'config', 'config.yaml'), 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    data['bilibili'].update(accounts=accounts, batch_size=args.batch_size,
+                            api_base=mock.url, passport_base=mock.url, www_base=mock.url)
+    data['monitor'].update(mid=0, max_retries=args.max_retries)
+    data['danmaku'].update(send_interval=args.send_interval)
+    config._config = data
+    config.account_store = AccountStore(os.path.join(tmp, 'accounts'))
+    config.save_accounts()
+
+
+def parse_account_intervals(items: list) -> dict:
+    intervals = {}
+    for item in items:
+        index, _, seconds = item.partition('=')
+        intervals[int(index)] = float(seconds)
+    return intervals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--send-interval', type=float, default=1.0, help='客户端每个账号的发送间隔(秒)')
+    parser.add_argument('--batch-size', type=int, default=3)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--interval', type=float, default=1.0, help='服务端每个账号的最小发送间隔(秒)')
+    parser.add_argument('--account-interval', action='append', default=[], metavar='序号=秒')
+    parser.add_argument('--expire-after', type=int, help='账号成功发送多少条后Cookie失效')
+    parser.add_argument('--no-refresh', action='store_true', help='失效的Cookie无法刷新')
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--xml', help='使用已有的录播弹幕XML，不传时生成合成数据')
+    parser.add_argument('--hours', type=float, default=0.1)
+    parser.add_argument('--density', type=float, default=60, help='每分钟弹幕数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='输出每条弹幕的发送日志')
+    parser.add_argument('--metrics', action='store_true', help='结束时输出 Prometheus 格式的运行指标')
+    parser.add_argument('--output', help='追加结果的 JSON Lines 文件')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    intervals = parse_account_intervals(args.account_interval)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockBilibili(interval=args.interval, latency=args.latency, jitter=args.jitter,
+                         expire_after=args.expire_after, refreshable=not args.no_refresh, seed=args.seed) as mock:
+        xml_path = os.path.join(tmp, 'sim.xml')
+        if args.xml:
+            with open(args.xml, 'rb') as src, open(xml_path, 'wb') as dst:
+                dst.write(src.read())
+        else:
+            generate_xml(xml_path, args.hours, args.density, 0.05, 0.3, 8, args.seed)
+        accounts = [mock.add_account(10000 + i, interval=intervals.get(i)) for i in range(args.accounts)]
+        setup_config(args, mock, accounts, tmp)
+
+        from api import SendIncomplete, auto_send_danmaku, load_send_plan
+
+        total = len(load_send_plan(xml_path))
+        mock.add_video(BVID, [(CID, 'P1', int(args.hours * 3600))])
+        start = time.monotonic()
+        try:
+            auto_send_danmaku(xml_path, CID, int(args.hours * 3600), BVID, False)
+        except SendIncomplete as e:
+            print(f"发送中止: {e}")
+        elapsed = time.monotonic() - start
+
+    stats = mock.stats
+    sent = stats['ok']
+    per_minute = sent / elapsed * 60 if elapsed else 0
+    # 客户端与服务端限速中较慢的一方决定每个账号的上限
+    ceiling = sum(60 / max(args.send_interval, acc.interval, 1e-9) for acc in mock.accounts.values())
+    print(f"计划 {total} 条，成功 {sent} 条，耗时 {elapsed:.1f} 秒")
+    print(f"每分钟 {per_minute:.1f} 条（理论上限 {ceiling:.1f}），请求 {stats['post']} 次，"
+          f"频率限制 {stats['rate_limited']} 次，Cookie失效 {stats['expired']} 次，刷新 {stats['refreshed']} 次")
+    print(f"{'账号':<10}{'限速(秒)':>10}{'成功':>8}{'频率限制':>10}{'失效':>6}{'刷新':>6}")
+    for acc in mock.accounts.values():
+        print(f"{acc.uname:<10}{acc.interval:>10.1f}{acc.stats['ok']:>8}{acc.stats['rate_limited']:>10}"
+              f"{acc.stats['expired']:>6}{acc.stats['refreshed']:>6}")
+
+    if args.metrics:
+        from metrics import metrics
+        print(metrics.render(), end='')
+
+    if args.output:
+        params = {k: v for k, v in vars(args).items() if k not in ('output', 'verbose', 'metrics')}
+        entry = {'time': int(time.time()), 'commit': git_commit(), 'params': params, 'total': total,
+                 'elapsed': elapsed, 'per_minute': per_minute, 'stats': dict(stats),
+                 'accounts': {acc.uname: dict(acc.stats) for acc in mock.accounts.values()}}
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        print(f"结果已追加到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""对比 _thin_window 与 _thin_window_numpy 在随机输入上的输出是否一致"""
+import os
+import random
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from api import _thin_window, _thin_window_numpy
+
+
+def random_case(rng: random.Random):
+    n = rng.randint(2, 3000)
+    timestamps = array('d')
+    t = rng.uniform(0, 100)
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.05:
+            t += rng.uniform(600, 7200)  # 长时间空档
+        elif r < 0.25:
+            pass  # 相同时间戳
+        else:
+            t += rng.expovariate(1 / rng.choice([0.1, 1, 5]))
+        timestamps.append(round(t, rng.choice([0, 3, 6])))
+    normal = sorted(range(n), key=timestamps.__getitem__)
+    # 模拟过滤后只剩部分下标
+    normal = [i for i in normal if rng.random() > 0.2] or normal[:2]
+    max_count = rng.randint(1, max(1, len(normal) - 1))
+    return normal, timestamps, max_count
+
+
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(seed)
+    for k in range(rounds):
+        normal, timestamps, max_count = random_case(rng)
+        expected = _thin_window(normal, timestamps, max_count)
+        actual = _thin_window_numpy(normal, timestamps, max_count)
+        if expected != actual:
+            print(f"第 {k} 轮结果不一致: n={len(normal)} max_count={max_count}")
+            sys.exit(1)
+    print(f"{rounds} 轮随机输入结果一致")